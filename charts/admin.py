@@ -1,8 +1,59 @@
 from django.contrib import admin
+from .columnar import parse_year_quarter
+from .importers import delete_rows
+from .metrics import rebuild_site_metrics
 from .models import RegionData, Gini, IncomeData
+from .regions import normalize_region, rebuild_area_aggregates
+from .versions import bump_data_version
 
 # Register your models here.
 
-admin.site.register(RegionData)
-admin.site.register(Gini)
-admin.site.register(IncomeData)
\ No newline at end of file
+
+class DataVersionAdmin(admin.ModelAdmin):
+    """后台修改数据后调用 data_changed 更新派生数据；数据版本号由 post_save/post_delete 信号递增，批量删除时只递增一次。"""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.data_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.data_changed()
+
+    def delete_queryset(self, request, queryset):
+        # 批量删除：一条 DELETE 语句，版本号只递增一次，不逐行发送 post_delete
+        delete_rows(queryset)
+        bump_data_version(self.model)
+        self.data_changed()
+
+    def data_changed(self):
+        pass
+
+
+class RegionDataAdmin(DataVersionAdmin):
+    readonly_fields = ('short_name', 'code')
+
+    def save_model(self, request, obj, form, change):
+        obj.short_name, obj.code = normalize_region(obj.region)  # 与导入时相同的名称规范化
+        super().save_model(request, obj, form, change)
+
+    def data_changed(self):
+        super().data_changed()
+        rebuild_area_aggregates()  # 同步更新大区汇总表
+
+
+class SiteMetricSourceAdmin(DataVersionAdmin):
+    readonly_fields = ('year', 'quarter')
+
+    def save_model(self, request, obj, form, change):
+        obj.year, obj.quarter = parse_year_quarter(obj.year_quarter)  # 与导入时相同的年季度解析
+        super().save_model(request, obj, form, change)
+
+    def data_changed(self):
+        super().data_changed()
+        rebuild_site_metrics([self.model])  # 同步更新首页面板的指标
+
+
+admin.site.register(RegionData, RegionDataAdmin)
+admin.site.register(Gini, SiteMetricSourceAdmin)
+admin.site.register(IncomeData, SiteMetricSourceAdmin)
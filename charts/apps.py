@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ChartsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'charts'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from charts.instrumentation import install_query_recorder
+        from charts.models import Gini, IncomeData, RegionData
+        from charts.sqlite import apply_sqlite_pragmas
+        from charts.versions import data_changed, data_imported
+        connection_created.connect(apply_sqlite_pragmas)
+        connection_created.connect(install_query_recorder)
+        # 图表数据表逐行修改（后台、shell）时递增版本号；导入命令批量写入后发送 data_imported
+        for model in (RegionData, Gini, IncomeData):
+            post_save.connect(data_changed, sender=model, dispatch_uid=f'charts-data-changed-save-{model.__name__}')
+            post_delete.connect(data_changed, sender=model, dispatch_uid=f'charts-data-changed-delete-{model.__name__}')
+        data_imported.connect(data_changed, dispatch_uid='charts-data-changed-import')
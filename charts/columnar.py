@@ -0,0 +1,191 @@
+import hashlib
+
+import numpy as np
+from django.db import models
+
+from charts.models import Gini, IncomeData, RegionData
+from charts.query_cache import cached_read
+from charts.regions import AREA_DICT, CODE_AREA
+from charts.snapshot import get_snapshot
+from charts.versions import get_model_version
+
+# 列式数据存储：每张表用一次查询整体取出，转换为 NumPy 数组后按表的版本号缓存在进程内存中（charts.query_cache）。
+# 字符串列（地区名称、年季度）以整数编码保存，取值表放在 labels 中；各表也可以导出为二进制快照（charts.snapshot），
+# 快照与数据库的版本号一致时直接内存映射快照，不查询数据库。
+
+# 季度中文数字 -> 季度序号
+QUARTER_NUMBERS = {'一': 1, '二': 2, '三': 3, '四': 4}
+
+# 年季度表中加载为数组的数值列
+GINI_FIELDS = (
+    'gini_coefficient', 'disposable_income_growth', 'median_disposable_income_growth', 'wage_income_growth',
+    'business_income_growth', 'property_income_growth', 'transfer_income_growth',
+)
+INCOME_FIELDS = ('total_income', 'wage_income', 'business_income', 'property_income', 'transfer_income')
+
+# 大区 -> 序号（按 AREA_DICT 的顺序）
+AREA_INDEX = {area: i for i, area in enumerate(AREA_DICT)}
+
+
+# "2014_Q一" -> (2014, 1)；导入时用它计算 Gini、IncomeData 的 year 与 quarter 列
+def parse_year_quarter(year_quarter):
+    year, _, quarter = year_quarter.partition('_Q')
+    if quarter not in QUARTER_NUMBERS or not year.isdigit():
+        raise ValueError(f'Invalid year_quarter {year_quarter!r}, expected e.g. "2014_Q一"')
+    return int(year), QUARTER_NUMBERS[quarter]
+
+
+class ColumnStore:
+    """按年份排序的列式数据：key 为 labels 中的下标，columns 为其余各列，均为等长的 NumPy 数组。
+
+    presorted 为 True 时数组已经按 (year, key) 排序（如来自快照的只读数组），直接使用，不复制。
+    """
+
+    def __init__(self, year, key, labels, columns, presorted=False):
+        if not presorted:
+            order = np.lexsort((key, year))  # 先按年份、再按 key 排序
+            year, key = year[order], key[order]
+            columns = {name: column[order] for name, column in columns.items()}
+        self.year = year
+        self.key = key
+        self.labels = np.asarray(labels, dtype=object)
+        self.columns = columns
+        self.years = np.unique(self.year).tolist()
+        # 每一年在数组中的起止位置，按年份切片无需扫描整列
+        self._bounds = dict(zip(self.years, zip(
+            np.searchsorted(self.year, self.years, side='left').tolist(),
+            np.searchsorted(self.year, self.years, side='right').tolist(),
+        )))
+
+    def __contains__(self, year):
+        return year in self._bounds
+
+    def __len__(self):
+        return len(self.year)
+
+    def rows(self, year):
+        start, stop = self._bounds.get(year, (0, 0))
+        return slice(start, stop)
+
+    def column(self, name, year=None):
+        column = self.columns[name]
+        return column if year is None else column[self.rows(year)]
+
+    def names(self, year=None, index=None):
+        # 名称列表；index 为该年内的行下标（如排序结果）
+        keys = self.key if year is None else self.key[self.rows(year)]
+        if index is not None:
+            keys = keys[index]
+        return self.labels[keys].tolist()
+
+    def values(self, name, year=None, index=None):
+        # 转换为 Python 数值列表，供 pyecharts 序列化
+        column = self.column(name, year)
+        if index is not None:
+            column = column[index]
+        return column.tolist()
+
+    def year_digests(self):
+        """{年份: 该年数据的摘要}，覆盖该年所有行的名称与各列取值，其中任何一项变化（包括改名）摘要都会变化。"""
+        labels = hashlib.blake2b('\x1f'.join(map(str, self.labels)).encode('utf-8'), digest_size=16).digest()
+        digests = {}
+        for year in self.years:
+            rows = self.rows(year)
+            digest = hashlib.blake2b(labels, digest_size=16)
+            digest.update(self.key[rows].tobytes())
+            for name in sorted(self.columns):
+                digest.update(name.encode('utf-8'))
+                digest.update(self.columns[name][rows].tobytes())
+            digests[year] = digest.hexdigest()
+        return digests
+
+    def year_ends(self):
+        # 每一年最后一行的下标（年季度表中即该年最后一个季度）
+        return np.array([stop - 1 for _, stop in self._bounds.values()], dtype=np.intp)
+
+    def argsort(self, name, year, descending=False):
+        """该年内按某列排序后的行下标（稳定排序，相等的值保持原有顺序）。"""
+        column = self.column(name, year)
+        return np.argsort(-column if descending else column, kind='stable')
+
+    def group(self, name, year, group_count):
+        """按整数分组列把该年的行分组，返回每组的行下标（组号为负的行不属于任何组）。"""
+        groups = self.column(name, year)
+        order = np.argsort(groups, kind='stable')
+        bounds = np.searchsorted(groups[order], np.arange(group_count + 1))
+        return [order[bounds[i]:bounds[i + 1]] for i in range(group_count)]
+
+
+def _build_region_store():
+    rows = list(RegionData.objects.values_list('year', 'region', 'metric_value', 'code'))
+    years, regions, values, codes = zip(*rows) if rows else ((), (), (), ())
+    labels, key = np.unique(np.array(regions, dtype=object), return_inverse=True)
+    # 行政区划代码只有几十种取值：先对取值去重，再映射为整数代码与大区序号
+    code_labels, code_index = np.unique(np.array(codes, dtype=object), return_inverse=True)
+    code_values = np.array([int(c) if c else -1 for c in code_labels], dtype=np.int32)
+    area_values = np.array([AREA_INDEX.get(CODE_AREA.get(c), -1) for c in code_labels], dtype=np.int8)
+    return ColumnStore(
+        np.array(years, dtype=np.int32), key.astype(np.int32), labels,
+        {
+            'value': np.array(values, dtype=np.int64),
+            'code': code_values[code_index],  # 全国为 0，无法识别的地区为 -1
+            'area': area_values[code_index],  # 大区序号，不属于任何大区为 -1
+        },
+    )
+
+
+def _build_quarter_store(model, fields):
+    # 年季度表：按整数的 (year, quarter) 列排序（year_quarter 字符串排序会得到 Q一、Q三、Q二、Q四）
+    rows = list(model.objects.order_by('year', 'quarter').values_list('year', 'quarter', 'year_quarter', *fields))
+    labels = [row[2] for row in rows]
+    columns = {
+        name: np.array([row[i + 3] for row in rows],
+                       dtype=np.float64 if isinstance(model._meta.get_field(name), models.FloatField) else np.int64)
+        for i, name in enumerate(fields)
+    }
+    columns['quarter'] = np.array([row[0] * 10 + row[1] for row in rows], dtype=np.int32)
+    return ColumnStore(
+        np.array([row[0] for row in rows], dtype=np.int32),
+        np.arange(len(labels), dtype=np.int32), labels, columns, presorted=True,
+    )
+
+
+# 各模型的列式存储构建函数（从数据库整表加载），也是写入快照的表
+STORE_BUILDERS = {
+    RegionData: _build_region_store,
+    Gini: lambda: _build_quarter_store(Gini, GINI_FIELDS),
+    IncomeData: lambda: _build_quarter_store(IncomeData, INCOME_FIELDS),
+}
+
+
+def _snapshot_store(model, version):
+    # 快照中该表的版本号与数据库一致时，直接使用快照中内存映射的数组，不查询数据库
+    snapshot = get_snapshot()
+    table = snapshot.table(model.__name__, version) if snapshot is not None else None
+    if table is None:
+        return None
+    year, key, labels, columns = table
+    return ColumnStore(year, key, labels, columns, presorted=True)
+
+
+def _cached_store(model, version=None):
+    # 各图表共用同一个对象，数据导入后版本号变化自动失效；调用方不得修改其中的数组
+    if version is None:
+        version = get_model_version(model)
+    return cached_read(model, 'column-store',
+                       lambda: _snapshot_store(model, version) or STORE_BUILDERS[model](), version)
+
+
+# RegionData：列 value（收入）、code（行政区划代码）、area（大区序号）
+def load_region_store(version=None):
+    return _cached_store(RegionData, version)
+
+
+# Gini：各增长率与基尼系数列，另有 quarter 列（年份*10+季度）
+def load_gini_store(version=None):
+    return _cached_store(Gini, version)
+
+
+# IncomeData：各收入列，另有 quarter 列（年份*10+季度）
+def load_income_store(version=None):
+    return _cached_store(IncomeData, version)
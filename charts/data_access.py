@@ -0,0 +1,65 @@
+import hashlib
+from collections import OrderedDict
+
+from charts.models import AreaYearAggregate
+from charts.query_cache import cached_rows
+from charts.regions import AREA_DICT
+
+# 图表数据访问层：大区汇总表的加载。
+# RegionData、Gini、IncomeData 的明细数据由 charts.columnar 整表加载为 NumPy 数组。
+
+
+class YearIndexedTable:
+    """按年份索引的列式数据：每一年对应 (名称列表, 数值列表)。"""
+
+    def __init__(self):
+        self._names = OrderedDict()  # year -> [name, ...]
+        self._values = OrderedDict()  # year -> [value, ...]
+
+    def append(self, year, name, value):
+        if year not in self._names:
+            self._names[year] = []
+            self._values[year] = []
+        self._names[year].append(name)
+        self._values[year].append(value)
+
+    @property
+    def years(self):
+        return list(self._names.keys())
+
+    def names(self, year):
+        return self._names.get(year, [])
+
+    def values(self, year):
+        return self._values.get(year, [])
+
+    def year_digests(self):
+        """{年份: 该年数据（名称、数值）的摘要}。"""
+        return {
+            year: hashlib.blake2b(repr((self._names[year], self._values[year])).encode('utf-8'),
+                                  digest_size=16).hexdigest()
+            for year in self._names
+        }
+
+    def data_pair(self, year):
+        # 供 Map/Pie 等图表的 data_pair 参数使用
+        return [list(z) for z in zip(self.names(year), self.values(year))]
+
+    def __contains__(self, year):
+        return year in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+
+# 一次查询取出全部大区汇总，每一年都包含所有大区（无数据的大区合计为 0）；
+# 查询结果按 AreaYearAggregate 的版本号 version 缓存
+def load_area_table(version=None):
+    totals = {}
+    for year, area, total in cached_rows(AreaYearAggregate.objects.values_list('year', 'area', 'total'), version):
+        totals.setdefault(year, {})[area] = total
+    table = YearIndexedTable()
+    for year in sorted(totals):
+        for area in AREA_DICT:
+            table.append(year, area, totals[year].get(area, 0))
+    return table
@@ -0,0 +1,70 @@
+import numpy as np
+from django.conf import settings
+
+# 服务端降采样：很长的折线/柱状图系列在交给 pyecharts 之前缩减到设定的点数，
+# 折线用 LTTB（Largest-Triangle-Three-Buckets）保持形状，柱状图按区间取平均。
+
+
+def get_max_points(chart_name):
+    """图表每个系列的最多数据点数：CHARTS_MAX_POINTS 中按图表名称设置，否则为 CHARTS_DEFAULT_MAX_POINTS。"""
+    per_chart = getattr(settings, 'CHARTS_MAX_POINTS', None) or {}
+    if chart_name in per_chart:
+        return per_chart[chart_name]
+    return getattr(settings, 'CHARTS_DEFAULT_MAX_POINTS', None)
+
+
+def lttb_indices(values, threshold):
+    """从等间距的序列中选出 threshold 个最能保持折线形状的点，返回递增的下标（始终包含首尾两点）。"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    threshold = max(threshold, 3)
+    if n <= threshold:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)  # 中间各桶的宽度
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0  # 上一个选中的点
+    for i in range(threshold - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        # 下一个桶的平均点（最后一个桶之后是末尾的点）
+        next_start, next_end = end, (n if i == threshold - 3 else int((i + 2) * every) + 1)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = values[next_start:next_end].mean()
+        # 与上一个选中点、下一个桶的平均点组成的三角形面积最大的点
+        x = np.arange(start, end)
+        areas = np.abs((a - avg_x) * (values[start:end] - values[a]) - (a - x) * (avg_y - values[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def bucket_means(values, indices):
+    """按选中的下标把序列切分为区间 (上一个下标, 当前下标]，返回每个区间的平均值。"""
+    values, indices = np.asarray(values, dtype=np.float64), np.asarray(indices)
+    starts = np.r_[0, indices[:-1] + 1]
+    counts = np.diff(np.r_[starts, indices[-1] + 1])
+    return np.add.reduceat(values, starts) / counts
+
+
+def downsample_overlap(labels, line, bars, max_points):
+    """柱状图与折线图共用 x 轴时的降采样，返回 (x轴标签, 折线数据, [各柱状图系列])。
+
+    折线按 LTTB 选点，x 轴只保留选中的类目；每根柱子为上一个选中点之后到该点之间的平均值。
+    """
+    if not max_points or len(labels) <= max_points:
+        return labels, line, bars
+    index = lttb_indices(line, max_points)
+    return (
+        [labels[i] for i in index.tolist()],
+        np.asarray(line)[index].tolist(),
+        [np.round(bucket_means(bar, index), 2).tolist() for bar in bars],
+    )
+
+
+def sampling_opts(kind):
+    """开启 CHARTS_CLIENT_SAMPLING 时，add_yaxis 使用的 ECharts 客户端降采样参数（kind 为 "line" 或 "bar"）。"""
+    if not getattr(settings, 'CHARTS_CLIENT_SAMPLING', False):
+        return {}
+    if kind == 'line':
+        return {'sampling': 'lttb'}
+    return {'sampling': 'average', 'is_large': True}
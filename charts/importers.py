@@ -0,0 +1,249 @@
+import bz2
+import csv
+import gzip
+import operator
+import threading
+import time
+from functools import reduce
+from itertools import islice
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+
+from charts.versions import data_imported
+
+# 每批（chunk）写入数据库的模型实例数量，同时也是导入过程中驻留内存的行数上限
+DEFAULT_BATCH_SIZE = 1000
+
+# 压缩文件的文件头 -> 打开方式，未压缩的文件使用内置 open
+_COMPRESSED_OPENERS = (
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+)
+
+# 导入模式：append 直接追加；upsert 按自然键更新已有行、插入新行；replace 清空表后重新导入
+MODE_APPEND = 'append'
+MODE_UPSERT = 'upsert'
+MODE_REPLACE = 'replace'
+IMPORT_MODES = (MODE_APPEND, MODE_UPSERT, MODE_REPLACE)
+
+
+# 将任意可迭代对象切分为固定大小的批次（惰性，不会一次性读入整个文件）
+def iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def delete_rows(queryset):
+    """用一条 DELETE 语句删除查询集中的行，返回删除的行数；调用方负责之后递增一次数据版本号。
+
+    图表数据表连接了 post_delete（逐行修改时递增版本号），delete() 因此会先取出每一行、逐行发送信号；
+    批量删除不需要这些信号。不做级联删除，因此只用于没有被外键引用的表，被引用时抛出 ValueError。
+    """
+    model = queryset.model
+    if model._meta.related_objects:
+        raise ValueError(f'{model.__name__} is referenced by other tables, use delete() to cascade')
+    if queryset.query.is_sliced:
+        raise TypeError('Cannot delete rows of a sliced queryset')
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql, params = f'DELETE FROM {table}', ()
+    if queryset.query.has_filters():
+        subquery, params = queryset.order_by().values('pk').query.sql_with_params()
+        sql += f' WHERE {connection.ops.quote_name(model._meta.pk.column)} IN ({subquery})'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+class BulkImporter:
+    """按批次构建模型实例，并在单个事务中使用 bulk_create / bulk_update 写入。"""
+
+    def __init__(self, model, natural_key, mode=MODE_APPEND, batch_size=DEFAULT_BATCH_SIZE):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f'Unknown import mode: {mode}')
+        self.model = model
+        self.natural_key = tuple(natural_key)  # 自然键字段，如 ('year', 'region')
+        self.mode = mode
+        self.batch_size = batch_size
+        # upsert 时需要更新的字段：除主键和自然键以外的所有字段
+        self.update_fields = [
+            f.name for f in model._meta.concrete_fields
+            if not f.primary_key and f.name not in self.natural_key
+        ]
+        self.row_count = 0  # 已写入的行数
+        self.created_count = 0  # 新插入的行数
+        self.updated_count = 0  # 更新的行数
+        self.elapsed = 0.0  # 耗时（秒）
+        self._lock = threading.Lock()  # 多个写入线程共用一个导入器时保护计数
+
+    def key_of(self, obj):
+        return tuple(getattr(obj, name) for name in self.natural_key)
+
+    def run(self, objects):
+        start = time.perf_counter()
+        # 整个导入过程放在一个事务中，避免每行一次提交/fsync
+        with transaction.atomic():
+            self.begin()
+            for batch in iter_batches(objects, self.batch_size):
+                self.write_batch(batch)
+            self.finish()
+        self.elapsed = time.perf_counter() - start
+        return self.row_count
+
+    # 写入第一批数据之前调用：replace 模式下先清空表
+    def begin(self):
+        if self.mode == MODE_REPLACE:
+            delete_rows(self.model.objects.all())
+
+    # 写入一批模型实例（调用方负责事务）
+    def write_batch(self, batch):
+        if self.mode == MODE_UPSERT:
+            created, updated = self._upsert_batch(batch)
+        else:
+            self.model.objects.bulk_create(batch, batch_size=self.batch_size)
+            created, updated = len(batch), 0
+        with self._lock:
+            self.created_count += created
+            self.updated_count += updated
+            self.row_count += len(batch)
+
+    # 全部写入之后调用：发送 data_imported，与数据一同提交递增后的数据版本号，使图表缓存失效
+    def finish(self):
+        data_imported.send(sender=self.model)
+
+    def _upsert_batch(self, batch):
+        # 同一批次内的重复键以最后一行为准
+        pending = {self.key_of(obj): obj for obj in batch}
+        existing = self._existing_pks(list(pending))
+        to_create, to_update = [], []
+        for key, obj in pending.items():
+            if key in existing:
+                obj.pk = existing[key]
+                to_update.append(obj)
+            else:
+                to_create.append(obj)
+        if to_create:
+            self.model.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            self.model.objects.bulk_update(to_update, self.update_fields, batch_size=self.batch_size)
+        return len(to_create), len(to_update)
+
+    def _existing_pks(self, keys):
+        """{自然键: 主键}：取出 keys 中已存在的行。
+
+        按数据库的参数个数上限（SQLite 为 999）分块查询；单字段键用 IN，多字段键按键的取值组合精确匹配
+        （(a = ? AND b = ?) OR ...），不会取出各字段取值交叉组合出的其他行。
+        """
+        max_params = connections[self.model.objects.db].features.max_query_params
+        chunk_size = max(max_params // len(self.natural_key), 1) if max_params else len(keys)
+        existing = {}
+        for chunk in iter_batches(keys, chunk_size):
+            if len(self.natural_key) == 1:
+                condition = Q(**{f'{self.natural_key[0]}__in': [key[0] for key in chunk]})
+            else:
+                condition = reduce(operator.or_, (Q(**dict(zip(self.natural_key, key))) for key in chunk))
+            for pk, *key in self.model.objects.filter(condition).values_list('pk', *self.natural_key):
+                existing[tuple(key)] = pk
+        return existing
+
+    @property
+    def rows_per_second(self):
+        if self.elapsed <= 0:
+            return float(self.row_count)
+        return self.row_count / self.elapsed
+
+
+class BaseImportCommand(BaseCommand):
+    """import_csv_* 命令的公共基类，子类只需实现 iter_objects。"""
+    model = None
+    natural_key = ()  # 模型的自然键字段
+    success_message = 'Data imported successfully'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', type=str, help='Path to the CSV file (may be gzip or bz2 compressed)')
+        parser.add_argument('--chunk-size', '--batch-size', dest='chunk_size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of rows held in memory and written per bulk INSERT')
+        parser.add_argument('--mode', choices=IMPORT_MODES, default=MODE_APPEND,
+                            help='append: insert rows as-is; upsert: update existing rows by natural key and '
+                                 'insert new ones; replace: delete all rows before importing')
+
+    # 由子类实现：从 csv 读取器中逐行生成（未保存的）模型实例
+    def iter_objects(self, csv_file):
+        raise NotImplementedError('subclasses of BaseImportCommand must provide an iter_objects() method')
+
+    # 导入完成后、事务提交前调用，子类可在此更新派生数据（如汇总表）
+    def after_import(self):
+        pass
+
+    def handle(self, *args, **options):
+        importer = BulkImporter(self.model, self.natural_key, mode=options['mode'],
+                                batch_size=options['chunk_size'])
+        try:
+            with transaction.atomic(), open_csv(options['csv_file']) as csv_file:
+                importer.run(self.iter_objects(csv_file))
+                self.after_import()
+        except IntegrityError as e:
+            raise CommandError(f'{e}. The data seems to be imported already, use --mode=upsert or --mode=replace.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{self.success_message} ({importer.row_count} rows in {importer.elapsed:.3f}s, '
+            f'{importer.rows_per_second:.0f} rows/s; '
+            f'{importer.created_count} created, {importer.updated_count} updated)'
+        ))
+        export_snapshot_after_import(self.stdout)
+        prerender_after_import(self.stdout)
+
+
+def export_snapshot_after_import(stdout):
+    # 配置了 CHARTS_SNAPSHOT_PATH 时，导入完成后重新导出数据快照
+    if getattr(settings, 'CHARTS_SNAPSHOT_PATH', None):
+        call_command('export_snapshot', settings.CHARTS_SNAPSHOT_PATH, stdout=stdout)
+
+
+def prerender_after_import(stdout):
+    # 配置了 CHARTS_PRERENDER_DIR 时，导入完成后自动重新生成静态站点
+    if getattr(settings, 'CHARTS_PRERENDER_DIR', None):
+        call_command('prerender_site', settings.CHARTS_PRERENDER_DIR, stdout=stdout)
+
+
+def open_csv(path):
+    """以文本方式打开 csv 文件，根据文件头自动识别 gzip/bz2 压缩，解压是流式进行的。"""
+    with open(path, 'rb') as f:
+        magic = f.read(3)
+    opener = open
+    for prefix, compressed_opener in _COMPRESSED_OPENERS:
+        if magic.startswith(prefix):
+            opener = compressed_opener
+            break
+    # utf-8-sig 兼容 Excel 导出的带 BOM 的文件
+    return opener(path, 'rt', encoding='utf-8-sig', newline='')
+
+
+def read_csv_rows(csv_file):
+    """返回 (表头, 数据行迭代器)。"""
+    csv_reader = csv.reader(csv_file, delimiter=',')
+    header = next(csv_reader)
+    return header, csv_reader
+
+
+def melt_wide_rows(header, rows):
+    """将宽表（第一列为键，其余每列一个地区）惰性地转换为长表 (键, 列名, 值)。
+
+    逐行读取、逐个单元格生成，不会在内存中保留整张表；空单元格会被跳过。
+    """
+    columns = header[1:]
+    for row in rows:
+        if not row:
+            continue
+        key = row[0]
+        for column, value in zip(columns, row[1:]):
+            if value.strip():
+                yield key, column, value
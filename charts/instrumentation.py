@@ -0,0 +1,221 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# 请求级性能计时：RequestTimingMiddleware 为每个请求创建一个 RequestTimings，放在上下文变量中；
+# 图表函数、渲染缓存与模板渲染各自把耗时记入其中（按图表名称与阶段区分），数据库查询通过每个连接上的 execute_wrapper 统计。
+# 请求结束时写入 Server-Timing 响应头，并汇总到进程内的直方图，由 /metrics 以 Prometheus 文本格式输出。
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 当前请求的计时（不在请求中时为 None，此时各计时点直接跳过）
+current_timings = ContextVar('charts_request_timings', default=None)
+# 正在构建的图表名称，数据库查询记在该图表名下
+current_chart = ContextVar('charts_current_chart', default=None)
+
+# Server-Timing 的指标名称只能包含 token 字符
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class RequestTimings:
+    """一个请求的计时：{(图表名称, 阶段): 秒}（图表名称为 None 表示不属于任何图表）与每个图表的查询次数。
+
+    异步页面视图在线程池中并发构建图表，各线程共用同一个对象，因此修改时加锁。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.queries = {}
+        self.total = 0.0
+
+    def add(self, chart, phase, seconds):
+        with self.lock:
+            self.phases[(chart, phase)] = self.phases.get((chart, phase), 0.0) + seconds
+
+    def add_query(self, chart, seconds):
+        with self.lock:
+            self.queries[chart] = self.queries.get(chart, 0) + 1
+            self.phases[(chart, 'db')] = self.phases.get((chart, 'db'), 0.0) + seconds
+
+    def phase_total(self, phase):
+        # 所有图表与请求本身在该阶段的耗时之和
+        return sum(seconds for (_, p), seconds in self.phases.items() if p == phase)
+
+    def query_count(self):
+        return sum(self.queries.values())
+
+
+def record_query(execute, sql, params, many, context):
+    # 数据库连接的 execute_wrapper：把查询耗时记在当前请求、当前图表名下
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(current_chart.get(), time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created 信号的处理函数：在每个新建的数据库连接上安装 record_query。
+
+    不在请求中时 record_query 直接执行查询；ASGI 下同步视图在其他线程中使用的连接同样会被统计。
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timed(phase, chart=None):
+    """把代码块的耗时记入当前请求的 phase 阶段，chart 默认为正在构建的图表。"""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(chart if chart is not None else current_chart.get(), phase, time.perf_counter() - start)
+
+
+def instrumented(name, func):
+    """包装图表函数：调用期间的耗时（total 阶段）与数据库查询都记在该图表名下。"""
+
+    @wraps(func)
+    def wrapper(**kwargs):
+        if current_timings.get() is None:
+            return func(**kwargs)
+        token = current_chart.set(name)
+        try:
+            with timed('total', name):
+                return func(**kwargs)
+        finally:
+            current_chart.reset(token)
+
+    return wrapper
+
+
+def server_timing_header(timings):
+    """Server-Timing 响应头：请求总耗时、全部查询、模板渲染，以及每个图表各阶段的耗时（毫秒）。"""
+    entries = [
+        f'total;dur={timings.total * 1000:.1f}',
+        f'db;dur={timings.phase_total("db") * 1000:.1f};desc="{timings.query_count()} queries"',
+        f'template;dur={timings.phase_total("template") * 1000:.1f}',
+    ]
+    for (chart, phase), seconds in sorted(timings.phases.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        if chart is None:
+            continue
+        entry = f'{_TOKEN_RE.sub("_", f"chart.{chart}.{phase}")};dur={seconds * 1000:.1f}'
+        if phase == 'db':
+            entry += f';desc="{timings.queries.get(chart, 0)} queries"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labels, extra=''):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """按标签取值累加的计数器（只在本进程内统计）。"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values = {}  # 标签取值 -> 计数
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+
+
+class Histogram(Counter):
+    """按标签取值统计的直方图，桶的上界默认取 CHARTS_METRICS_BUCKETS（秒）。"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets or getattr(settings, 'CHARTS_METRICS_BUCKETS', None) or DEFAULT_BUCKETS))
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)  # 第一个上界 >= value 的桶，超过所有上界时为 +Inf 桶
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {labels: list(counts) for labels, counts in self.values.items()}
+        for labels, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {counts[-1]}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+
+REQUEST_SECONDS = Histogram('charts_request_duration_seconds', 'Time spent serving a request.', ('view',))
+REQUEST_DB_SECONDS = Histogram('charts_request_db_seconds', 'Time spent in database queries per request.', ('view',))
+REQUEST_QUERIES = Counter('charts_request_db_queries_total', 'Database queries executed by requests.', ('view',))
+TEMPLATE_SECONDS = Histogram('charts_template_render_seconds', 'Time spent rendering templates.', ('view',))
+CHART_SECONDS = Histogram('charts_chart_phase_seconds', 'Time spent per chart and phase (total, cache, build, '
+                          'serialize, db).', ('chart', 'phase'))
+CHART_QUERIES = Counter('charts_chart_db_queries_total', 'Database queries executed while building charts.', ('chart',))
+
+REGISTRY = [REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_QUERIES, TEMPLATE_SECONDS, CHART_SECONDS, CHART_QUERIES]
+
+
+def observe_request(view, timings):
+    """把一个请求的计时汇总到各直方图中。"""
+    REQUEST_SECONDS.observe((view,), timings.total)
+    REQUEST_DB_SECONDS.observe((view,), timings.phase_total('db'))
+    REQUEST_QUERIES.inc((view,), timings.query_count())
+    TEMPLATE_SECONDS.observe((view,), timings.phase_total('template'))
+    for (chart, phase), seconds in list(timings.phases.items()):
+        if chart is not None:
+            CHART_SECONDS.observe((chart, phase), seconds)
+    for chart, count in list(timings.queries.items()):
+        if chart is not None:
+            CHART_QUERIES.inc((chart,), count)
+
+
+def render_metrics():
+    """Prometheus 文本格式（0.0.4）的全部指标。"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,246 @@
+import json
+import math
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django_echarts.stores.entity_factory import factory
+
+from charts.importers import delete_rows, iter_batches
+from charts.models import AreaYearAggregate, Gini, IncomeData, RegionData
+from charts.query_cache import query_cache
+from charts.regions import NATIONAL_CODE, PROVINCE_AREA, PROVINCE_CODES, rebuild_area_aggregates
+from charts.render_cache import get_render_cache
+from charts.site_views import site_obj
+from charts.versions import bump_data_version
+
+# 基准测试使用独立的本地内存缓存，不会污染网站的渲染缓存
+BENCHMARK_CACHE = 'charts-benchmark'
+
+# 默认数据规模：年份数 x 地区数
+DEFAULT_SCALES = '8x31,50x310'
+
+QUARTERS = ('Q一', 'Q二', 'Q三', 'Q四')
+
+# 最后一年固定为 2021 年，与仓库自带数据一致
+LAST_YEAR = 2021
+
+
+# "8x31,50x310" -> [(8, 31), (50, 310)]
+def parse_scales(value):
+    scales = []
+    for item in value.split(','):
+        try:
+            years, regions = (int(n) for n in item.lower().split('x'))
+        except ValueError:
+            raise CommandError(f'Invalid scale "{item}", expected YEARSxREGIONS such as 8x31')
+        scales.append((years, regions))
+    return scales
+
+
+def synthesize_data(years, regions, seed=0, batch_size=5000):
+    """清空数据表并生成指定规模的模拟数据（在调用方的事务中执行）。
+
+    地区依次取 31 个省份，超过 31 个时生成 "广东1"、"广东2" 等属于同一省份的地区；每年另有一行 "全国"。
+    """
+    rng = random.Random(seed)
+    for model in (RegionData, Gini, IncomeData, AreaYearAggregate):
+        delete_rows(model.objects.all())
+    year_range = range(LAST_YEAR - years + 1, LAST_YEAR + 1)
+
+    provinces = list(PROVINCE_AREA)
+    names = [('全国', '全国', NATIONAL_CODE)]
+    for i in range(regions):
+        province = provinces[i % len(provinces)]
+        suffix = i // len(provinces) or ''
+        names.append((f'{province}{suffix}', province, PROVINCE_CODES[province]))
+    bases = [rng.randint(10000, 40000) for _ in names]
+
+    def region_rows():
+        for offset, year in enumerate(year_range):
+            for (region, short_name, code), base in zip(names, bases):
+                yield RegionData(region=region, year=year, metric_value=base + 500 * offset + rng.randint(0, 999),
+                                 short_name=short_name, code=code)
+
+    for batch in iter_batches(region_rows(), batch_size):
+        RegionData.objects.bulk_create(batch)
+
+    year_quarters = [(f'{year}_{label}', year, quarter)
+                     for year in year_range for quarter, label in enumerate(QUARTERS, start=1)]
+    for batch in iter_batches((Gini(
+            year_quarter=year_quarter, year=year, quarter=quarter,
+            gini_coefficient=round(rng.uniform(0.45, 0.48), 3),
+            disposable_income_growth=round(rng.uniform(5, 10), 1),
+            median_disposable_income_growth=round(rng.uniform(5, 10), 1),
+            wage_income_growth=round(rng.uniform(5, 10), 1),
+            business_income_growth=round(rng.uniform(5, 10), 1),
+            property_income_growth=round(rng.uniform(5, 10), 1),
+            transfer_income_growth=round(rng.uniform(5, 10), 1),
+    ) for year_quarter, year, quarter in year_quarters), batch_size):
+        Gini.objects.bulk_create(batch)
+    for batch in iter_batches((IncomeData(
+            year_quarter=year_quarter, year=year, quarter=quarter,
+            total_income=rng.randint(5000, 40000),
+            wage_income=rng.randint(3000, 20000),
+            business_income=rng.randint(1000, 6000),
+            property_income=rng.randint(400, 3000),
+            transfer_income=rng.randint(800, 7000),
+    ) for year_quarter, year, quarter in year_quarters), batch_size):
+        IncomeData.objects.bulk_create(batch)
+
+    rebuild_area_aggregates()
+    for model in (RegionData, Gini, IncomeData):
+        bump_data_version(model)
+
+
+# 最近秩法计算百分位数，单位为毫秒
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def rank(q):
+        return round(samples[min(len(samples) - 1, max(math.ceil(q * len(samples)) - 1, 0))] * 1000, 3)
+
+    return {
+        'p50': rank(0.5), 'p90': rank(0.9), 'p99': rank(0.99), 'max': round(samples[-1] * 1000, 3),
+        'mean': round(sum(samples) / len(samples) * 1000, 3),
+    }
+
+
+def render_chart(name):
+    # 与网页渲染相同的路径：经过渲染缓存取得图表，再序列化 option
+    chart = factory.get_chart_widget(name)
+    return chart.dump_options() if chart is not None else ''
+
+
+def benchmark_chart(name, repeat):
+    """分别测量无缓存（查询、构建、序列化）与命中缓存时的耗时、查询次数，以及无缓存时的内存峰值。
+
+    无缓存的运行同时清空渲染缓存与进程内的查询结果缓存，每次都重新查询数据。
+    """
+    cache = get_render_cache()
+    cold, warm = [], []
+    for _ in range(repeat):
+        cache.clear()
+        query_cache.clear()
+        with CaptureQueriesContext(connection) as cold_queries:
+            start = time.perf_counter()
+            payload = render_chart(name)
+            cold.append(time.perf_counter() - start)
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as warm_queries:
+            start = time.perf_counter()
+            render_chart(name)
+            warm.append(time.perf_counter() - start)
+
+    # tracemalloc 会拖慢执行，单独运行一次测量内存
+    cache.clear()
+    query_cache.clear()
+    tracemalloc.start()
+    try:
+        render_chart(name)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'chart': name,
+        'cold_ms': percentiles(cold),
+        'warm_ms': percentiles(warm),
+        'cold_queries': len(cold_queries.captured_queries),
+        'warm_queries': len(warm_queries.captured_queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'json_bytes': len(payload.encode('utf-8')),
+    }
+
+
+def compare_reports(old, new, threshold):
+    """返回相对于旧报告的退化项：无缓存 p50 耗时超过 threshold 倍，或查询次数增加。"""
+    old_results = {(r['years'], r['regions'], r['chart']): r for r in old['results']}
+    regressions = []
+    for result in new['results']:
+        previous = old_results.get((result['years'], result['regions'], result['chart']))
+        if previous is None:
+            continue
+        label = f"{result['chart']} @ {result['years']}x{result['regions']}"
+        before, after = previous['cold_ms']['p50'], result['cold_ms']['p50']
+        if before > 0 and after / before > threshold:
+            regressions.append(f'{label}: cold p50 {before:.1f}ms -> {after:.1f}ms ({after / before:.2f}x)')
+        if result['cold_queries'] > previous['cold_queries']:
+            regressions.append(f"{label}: queries {previous['cold_queries']} -> {result['cold_queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every chart registered on site_obj against synthetic data of several sizes. '
+            'The data is generated inside a transaction that is rolled back afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default=DEFAULT_SCALES,
+                            help=f'Comma separated YEARSxREGIONS data sizes (default: {DEFAULT_SCALES})')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed renders per chart')
+        parser.add_argument('--charts', nargs='+', help='Only benchmark these charts (default: all registered)')
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the JSON report')
+        parser.add_argument('--compare', help='A previous JSON report; exit with an error on regressions')
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help='Slow-down ratio of cold p50 latency counted as a regression (default: 1.2)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic data')
+
+    def handle(self, *args, **options):
+        scales = parse_scales(options['scales'])
+        names = options['charts'] or site_obj.chart_names
+        unknown = set(names) - set(site_obj.chart_names)
+        if unknown:
+            raise CommandError(f'Unknown charts: {", ".join(sorted(unknown))}')
+        repeat = max(options['repeat'], 1)
+
+        results = []
+        benchmark_caches = {
+            **settings.CACHES,
+            BENCHMARK_CACHE: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': BENCHMARK_CACHE,
+                'TIMEOUT': None,
+            },
+        }
+        with override_settings(CACHES=benchmark_caches, CHARTS_RENDER_CACHE=BENCHMARK_CACHE):
+            for years, regions in scales:
+                with transaction.atomic():
+                    start = time.perf_counter()
+                    synthesize_data(years, regions, seed=options['seed'])
+                    self.stdout.write(f'{years} years x {regions} regions: '
+                                      f'data generated in {time.perf_counter() - start:.1f}s')
+                    for name in names:
+                        result = {'years': years, 'regions': regions, **benchmark_chart(name, repeat)}
+                        results.append(result)
+                        self.stdout.write(
+                            f"  {name:<28} cold p50 {result['cold_ms']['p50']:>9.1f}ms "
+                            f"p90 {result['cold_ms']['p90']:>9.1f}ms  warm p50 {result['warm_ms']['p50']:>7.2f}ms  "
+                            f"{result['cold_queries']:>4} queries  {result['peak_memory_kb']:>9.0f}KB"
+                        )
+                    transaction.set_rollback(True)  # 丢弃模拟数据
+                get_render_cache().clear()
+
+        report = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'seed': options['seed'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                regressions = compare_reports(json.load(f), report, options['threshold'])
+            for line in regressions:
+                self.stdout.write(self.style.WARNING(line))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions compared with {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regression compared with {options["compare"]}'))
@@ -0,0 +1,111 @@
+import json
+import resource
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+
+from charts.management.commands.benchmark_charts import percentiles
+
+# 默认请求的页面：首页、单个图表页（带时间轴）、图表列表
+DEFAULT_URLS = ('/', '/chart/gini/', '/list/')
+
+
+def default_host():
+    # 从 ALLOWED_HOSTS 中取一个可以直接使用的主机名
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+class WSGIClient:
+    """直接调用 WSGIHandler，与 WSGI 服务器的调用方式相同（django.test.Client 会取消请求结束时关闭数据库连接的处理）。"""
+
+    def __init__(self, host):
+        self.handler = WSGIHandler()
+        self.factory = RequestFactory(HTTP_HOST=host)
+
+    def get(self, url):
+        statuses = []
+        result = self.handler(self.factory.get(url).environ,
+                              lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(result)
+        finally:
+            result.close()  # 触发 request_finished，按 CONN_MAX_AGE 关闭或保留数据库连接
+        return int(statuses[0].split()[0])
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux 上单位为 KB
+
+
+class Command(BaseCommand):
+    help = ('Request pages through the full middleware stack with the current settings and report latency, '
+            'database connections opened and memory growth. Compare settings modules with '
+            'DJANGO_SETTINGS_MODULE; the database must already contain data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='*', default=DEFAULT_URLS, help='Pages to request (default: %(default)s)')
+        parser.add_argument('--requests', type=int, default=200, help='Number of timed requests per page')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per page before timing')
+        parser.add_argument('--host', help='Host header (default: the first usable entry of ALLOWED_HOSTS)')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        client = WSGIClient(options['host'] or default_host())
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        results = []
+        connection_created.connect(count_connection)
+        try:
+            for url in options['urls']:
+                for _ in range(options['warmup']):
+                    self.check_status(url, client.get(url))
+                opened.clear()
+                rss_before = max_rss_kb()
+                samples = []
+                for _ in range(max(options['requests'], 1)):
+                    start = time.perf_counter()
+                    status = client.get(url)
+                    samples.append(time.perf_counter() - start)
+                    self.check_status(url, status)
+                result = {
+                    'url': url,
+                    'ms': percentiles(samples),
+                    'connections_opened': len(opened),
+                    'max_rss_growth_kb': max_rss_kb() - rss_before,
+                }
+                results.append(result)
+                self.stdout.write(
+                    f"{url:<20} p50 {result['ms']['p50']:>8.2f}ms  p90 {result['ms']['p90']:>8.2f}ms  "
+                    f"mean {result['ms']['mean']:>8.2f}ms  {result['connections_opened']:>4} connections opened  "
+                    f"max RSS +{result['max_rss_growth_kb']}KB"
+                )
+        finally:
+            connection_created.disconnect(count_connection)
+
+        if options['output']:
+            report = {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'settings': settings.SETTINGS_MODULE,
+                'debug': settings.DEBUG,
+                'requests': options['requests'],
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Page benchmark report written to {options['output']}"))
+
+    def check_status(self, url, status):
+        if status != 200:
+            raise CommandError(f'{url} returned {status}')
@@ -0,0 +1,264 @@
+import json
+import os
+import queue as queue_module
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from pathlib import Path
+
+import django
+from django.apps import apps
+from django.core.management import load_command_class
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, connections, transaction
+
+from charts.importers import (
+    DEFAULT_BATCH_SIZE, IMPORT_MODES, MODE_APPEND, BulkImporter, export_snapshot_after_import, iter_batches,
+    open_csv, prerender_after_import, read_csv_rows
+)
+
+# 目录中会被导入的文件类型
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.bz2')
+
+
+# 根据 csv 表头判断应使用哪个导入命令
+def detect_import_command(header):
+    if header and header[0] == '年份':
+        return 'import_csv_DIBP'
+    if '居民人均可支配收入基尼系数' in header:
+        return 'import_csv_Gini'
+    if '居民人均可支配收入_累计值' in header:
+        return 'import_csv_DIN'
+    return None
+
+
+# 需要在进程间传递的模型字段（不含主键）
+def model_fields(model):
+    return [f.attname for f in model._meta.concrete_fields if not f.primary_key]
+
+
+def _init_worker():
+    # spawn 方式启动的子进程需要重新初始化 Django
+    if not apps.ready:
+        django.setup()
+
+
+def parse_file(path, command_name, chunk_size, batches):
+    """在子进程中解析一个文件：每批数据以字段值元组的形式放入队列，结束时放入 None。"""
+    try:
+        command = load_command_class('charts', command_name)
+        fields = model_fields(command.model)
+        count = 0
+        with open_csv(path) as csv_file:
+            for batch in iter_batches(command.iter_objects(csv_file), chunk_size):
+                batches.put((command_name, [tuple(getattr(obj, f) for f in fields) for obj in batch]))
+                count += len(batch)
+        return count
+    finally:
+        batches.put((command_name, None))
+
+
+class Command(BaseCommand):
+    help = 'Import every csv file in a directory (or listed in a JSON manifest), parsing files in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str,
+                            help='A directory of csv files, or a JSON manifest: [{"path": ..., "command": ...}]')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of parser processes')
+        parser.add_argument('--writers', type=int, default=1,
+                            help='Number of writer threads, append mode only '
+                                 '(always 1 on SQLite, which allows a single writer)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Number of rows per batch sent from parsers to writers')
+        parser.add_argument('--mode', choices=IMPORT_MODES, default=MODE_APPEND,
+                            help='Import mode, see import_csv_DIBP --help')
+
+    def collect_files(self, path):
+        """返回 [(文件路径, 导入命令名称)]。"""
+        path = Path(path)
+        if path.is_dir():
+            files = []
+            for file_path in sorted(path.iterdir()):
+                if not file_path.name.endswith(CSV_SUFFIXES):
+                    continue
+                with open_csv(file_path) as csv_file:
+                    header, _ = read_csv_rows(csv_file)
+                command_name = detect_import_command(header)
+                if command_name is None:
+                    self.stdout.write(self.style.WARNING(f'Skip {file_path.name}: unknown csv header'))
+                    continue
+                files.append((str(file_path), command_name))
+            return files
+        if path.is_file():
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            files = []
+            for entry in manifest:
+                file_path = path.parent / entry['path']
+                command_name = entry.get('command')
+                if command_name is None:
+                    with open_csv(file_path) as csv_file:
+                        header, _ = read_csv_rows(csv_file)
+                    command_name = detect_import_command(header)
+                if command_name is None:
+                    raise CommandError(f'Can not detect the import command of {file_path}')
+                files.append((str(file_path), command_name))
+            return files
+        raise CommandError(f'{path} does not exist')
+
+    def handle(self, *args, **options):
+        files = self.collect_files(options['path'])
+        if not files:
+            raise CommandError('No csv file to import.')
+        writers = max(options['writers'], 1)
+        if writers > 1 and options['mode'] != MODE_APPEND:
+            # 并发写入时每批数据各自提交：replace 会让读者看到清空后的表、出错时留下部分数据，
+            # upsert 的多个写入者还会在同一自然键上竞争，因此只允许 append
+            raise CommandError('--writers > 1 only supports --mode=append; replace and upsert run in a single '
+                               'transaction with one writer.')
+        if connection.vendor == 'sqlite' and writers > 1:
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer, using --writers=1'))
+            writers = 1
+
+        commands = {name: load_command_class('charts', name) for name in {name for _, name in files}}
+        importers = {
+            name: BulkImporter(command.model, command.natural_key, mode=options['mode'],
+                               batch_size=options['chunk_size'])
+            for name, command in commands.items()
+        }
+        fields = {name: model_fields(command.model) for name, command in commands.items()}
+
+        start = time.perf_counter()
+        workers = max(options['workers'], 1)
+        # fork 子进程之前关闭数据库连接，子进程只负责解析，不访问数据库
+        connections.close_all()
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            batches = manager.Queue(maxsize=workers * 4)  # 有界队列：解析快于写入时阻塞解析进程
+            futures = [
+                (file_path, pool.submit(parse_file, file_path, name, options['chunk_size'], batches))
+                for file_path, name in files
+            ]
+            try:
+                if writers == 1:
+                    # 单一写入者：所有文件在一个事务中写入
+                    with transaction.atomic():
+                        self.begin(importers)
+                        self.consume(batches, futures, importers, fields, self.write_batch)
+                        self.check_results(futures)
+                        self.finish(commands, importers)
+                else:
+                    # 只有 append 模式会并发写入，begin() 不需要删除数据
+                    self.begin(importers)
+                    self.consume_concurrently(batches, futures, importers, fields, writers)
+                    self.check_results(futures)
+                    with transaction.atomic():
+                        self.finish(commands, importers)
+            except BaseException as e:
+                self.abort(batches, futures)
+                if isinstance(e, IntegrityError):
+                    raise CommandError(
+                        f'{e}. The data seems to be imported already, use --mode=upsert or --mode=replace.'
+                    )
+                raise
+        elapsed = time.perf_counter() - start
+
+        for file_path, future in futures:
+            self.stdout.write(f'{file_path}: {future.result()} rows')
+        row_count = sum(importer.row_count for importer in importers.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(files)} files ({row_count} rows in {elapsed:.3f}s, '
+            f'{row_count / elapsed if elapsed > 0 else row_count:.0f} rows/s)'
+        ))
+        export_snapshot_after_import(self.stdout)
+        prerender_after_import(self.stdout)
+
+    @staticmethod
+    def begin(importers):
+        for importer in importers.values():
+            importer.begin()
+
+    @staticmethod
+    def finish(commands, importers):
+        # 更新派生数据并递增数据版本号
+        for name, command in commands.items():
+            command.after_import()
+            importers[name].finish()
+
+    @staticmethod
+    def write_batch(importer, objs):
+        importer.write_batch(objs)
+
+    @staticmethod
+    def consume(batches, futures, importers, fields, write):
+        """从队列中取出各解析进程产生的批次并写入，直到所有文件都解析完毕。"""
+        remaining = len(futures)
+        while remaining:
+            try:
+                command_name, rows = batches.get(timeout=1)
+            except queue_module.Empty:
+                # 解析进程异常退出时不会放入结束标记
+                if all(future.done() for _, future in futures) and batches.empty():
+                    break
+                continue
+            if rows is None:
+                remaining -= 1
+                continue
+            importer = importers[command_name]
+            names = fields[command_name]
+            write(importer, [importer.model(**dict(zip(names, row))) for row in rows])
+
+    def consume_concurrently(self, batches, futures, importers, fields, writers):
+        """多个写入线程并发写入（非 SQLite 数据库），每批数据一个事务。"""
+        pending = queue_module.Queue(maxsize=writers * 2)
+        errors = []
+
+        def writer():
+            try:
+                while True:
+                    item = pending.get()
+                    if item is None:
+                        return
+                    if errors:
+                        continue  # 已经出错：继续取出数据，避免主线程阻塞
+                    importer, objs = item
+                    try:
+                        with transaction.atomic():
+                            importer.write_batch(objs)
+                    except Exception as e:
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer, daemon=True) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        try:
+            self.consume(batches, futures, importers, fields, lambda importer, objs: pending.put((importer, objs)))
+        finally:
+            for _ in threads:
+                pending.put(None)
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def abort(batches, futures):
+        """写入出错：取消尚未开始的文件，并清空队列直到正在解析的进程退出，避免它们阻塞在队列上。"""
+        for _, future in futures:
+            future.cancel()
+        while not all(future.done() for _, future in futures):
+            try:
+                batches.get(timeout=0.1)
+            except queue_module.Empty:
+                pass
+
+    @staticmethod
+    def check_results(futures):
+        for file_path, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                raise CommandError(f'Failed to parse {file_path}: {e}')
@@ -1,31 +1,29 @@
 # myapp/management/commands/import_csv_DIBP.py
-import csv
-from django.core.management.base import BaseCommand
+from charts.importers import BaseImportCommand, melt_wide_rows, read_csv_rows
 from charts.models import RegionData
+from charts.regions import normalize_region, rebuild_area_aggregates
 
 
-class Command(BaseCommand):
+class Command(BaseImportCommand):
     help = 'Imports data from a CSV file into the Item model'
+    model = RegionData
+    natural_key = ('year', 'region')
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+    def iter_objects(self, csv_file):
+        header, csv_reader = read_csv_rows(csv_file)  # Read the header row
+        # 每一列的简称和行政区划代码只计算一次
+        names = {region: normalize_region(region) for region in header[1:]}
 
-    def handle(self, *args, **options):
-        csv_file_path = options['csv_file']
-        with open(csv_file_path, 'r') as file:
-            csv_reader = csv.reader(file, delimiter=',')  # Assuming tab-separated values
-            header = next(csv_reader)  # Read the header row
-
-            for row in csv_reader:
-                year = int(row[0])
-                for idx, value in enumerate(row[1:], start=1):
-                    region = header[idx]
-                    metric_value = int(value)
-                    RegionData.objects.create(
-                        region=region,
-                        year=year,
-                        metric_value=metric_value
-                    )
-
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+        # 宽表（每个地区一列）惰性转换为长表，逐个单元格生成模型实例
+        for year, region, value in melt_wide_rows(header, csv_reader):
+            short_name, code = names[region]
+            yield RegionData(
+                region=region,
+                year=int(year),
+                metric_value=int(value),
+                short_name=short_name,
+                code=code
+            )
 
+    def after_import(self):
+        rebuild_area_aggregates()  # 重新计算大区汇总表
@@ -1,26 +1,30 @@
 import csv
-from django.core.management.base import BaseCommand
+from charts.columnar import parse_year_quarter
+from charts.importers import BaseImportCommand
+from charts.metrics import rebuild_site_metrics
 from charts.models import IncomeData  # Replace 'your_app' with the actual name of your Django app
 
 
-class Command(BaseCommand):
+class Command(BaseImportCommand):
     help = 'Import income data from CSV file'
+    model = IncomeData
+    natural_key = ('year_quarter',)
+    success_message = 'Data imported successfully!'
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+    def iter_objects(self, csv_file):
+        csv_reader = csv.DictReader(csv_file)
+        for row in csv_reader:
+            year, quarter = parse_year_quarter(row['年份_季度'])  # 整数年份与季度，用于排序与按年份过滤
+            yield IncomeData(
+                year_quarter=row['年份_季度'],
+                year=year,
+                quarter=quarter,
+                total_income=int(row['居民人均可支配收入_累计值']),
+                wage_income=int(row['居民人均可支配工资性收入_累计值']),
+                business_income=int(row['居民人均可支配经营净收入_累计值']),
+                property_income=int(row['居民人均可支配财产净收入_累计值']),
+                transfer_income=int(row['居民人均可支配转移净收入_累计值']),
+            )
 
-    def handle(self, *args, **kwargs):
-        csv_file = kwargs['csv_file']
-        with open(csv_file, 'r') as file:
-            csv_reader = csv.DictReader(file)
-            for row in csv_reader:
-                IncomeData.objects.create(
-                    year_quarter=row['年份_季度'],
-                    total_income=int(row['居民人均可支配收入_累计值']),
-                    wage_income=int(row['居民人均可支配工资性收入_累计值']),
-                    business_income=int(row['居民人均可支配经营净收入_累计值']),
-                    property_income=int(row['居民人均可支配财产净收入_累计值']),
-                    transfer_income=int(row['居民人均可支配转移净收入_累计值']),
-                )
-
-        self.stdout.write(self.style.SUCCESS('Data imported successfully!'))
+    def after_import(self):
+        rebuild_site_metrics([IncomeData])  # 更新首页面板的指标
@@ -1,31 +1,32 @@
-import csv
+from charts.columnar import parse_year_quarter
+from charts.importers import BaseImportCommand, read_csv_rows
+from charts.metrics import rebuild_site_metrics
 from charts.models import Gini
-from django.core.management.base import BaseCommand
 
 
-class Command(BaseCommand):
+class Command(BaseImportCommand):
     help = 'Import Gini data from CSV'
+    model = Gini
+    natural_key = ('year_quarter',)
+    success_message = 'Gini data imported successfully.'
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help='Path to the CSV file')
+    def iter_objects(self, csv_file):
+        _, csv_reader = read_csv_rows(csv_file)  # Skip header row
 
-    def handle(self, *args, **options):
-        csv_file_path = options['csv_file']
+        for row in csv_reader:
+            year, quarter = parse_year_quarter(row[0])  # 整数年份与季度，用于排序与按年份过滤
+            yield Gini(
+                year_quarter=row[0],
+                year=year,
+                quarter=quarter,
+                gini_coefficient=float(row[1]),
+                disposable_income_growth=float(row[2]),
+                median_disposable_income_growth=float(row[3]),
+                wage_income_growth=float(row[4]),
+                business_income_growth=float(row[5]),
+                property_income_growth=float(row[6]),
+                transfer_income_growth=float(row[7])
+            )
 
-        with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file)
-            next(csv_reader)  # Skip header row
-
-            for row in csv_reader:
-                Gini.objects.create(
-                    year_quarter=row[0],
-                    gini_coefficient=float(row[1]),
-                    disposable_income_growth=float(row[2]),
-                    median_disposable_income_growth=float(row[3]),
-                    wage_income_growth=float(row[4]),
-                    business_income_growth=float(row[5]),
-                    property_income_growth=float(row[6]),
-                    transfer_income_growth=float(row[7])
-                )
-
-        self.stdout.write(self.style.SUCCESS('Gini data imported successfully.'))
+    def after_import(self):
+        rebuild_site_metrics([Gini])  # 更新首页面板的指标
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve
+from django_echarts.stores.entity_factory import factory
+
+from charts.render_cache import fresh_charts
+from charts.site_views import site_obj
+from charts.versions import get_data_version
+from charts.views import get_chart_data, get_frame_payload
+
+# 分页链接 "/list/?page=2" 改写为静态路径 "/list/page/2/"
+_PAGE_LINK_RE = re.compile(r'(["\'])/list/\?page=(\d+)\1')
+
+# 带内容哈希的数据文件所在的子目录
+DATA_DIR = 'data'
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def static_page_link(match):
+    quote, page = match.group(1), int(match.group(2))
+    return f'{quote}/list/{quote}' if page == 1 else f'{quote}/list/page/{page}/{quote}'
+
+
+def write_if_changed(path, content):
+    """内容不变时不重写文件，保留修改时间，便于 rsync/CDN 增量同步。返回是否写入。"""
+    if path.exists() and path.read_bytes() == content:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return True
+
+
+class Command(BaseCommand):
+    help = ('Render every page of the site (home, list, collections, charts), the option/data JSON of every '
+            'registered chart and the frames of lazily loaded timelines into a directory that can be served by a '
+            'static file server. '
+            'Static assets are published separately with collectstatic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', nargs='?', default=getattr(settings, 'CHARTS_PRERENDER_DIR', None),
+                            help='Output directory (default: settings.CHARTS_PRERENDER_DIR)')
+
+    def render(self, url):
+        # 不经过中间件直接调用视图，因此不受 ALLOWED_HOSTS 等请求级设置的影响
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        match = resolve(request.path_info)
+        view = async_to_sync(match.func) if asyncio.iscoroutinefunction(match.func) else match.func
+        response = view(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{url} returned HTTP {response.status_code}')
+        return response.content
+
+    def page_urls(self):
+        # 不包括 /about/：主题的 about.html 引用了主题中并不存在的 widgets/collection.html，无法渲染
+        urls = ['/', '/collection/']
+        urls += [f'/collection/{name}/' for name in site_obj._collection_dic]
+        urls += [f'/chart/{name}/' for name in site_obj.chart_names]
+        # 列表页按站点的分页设置拆分为多页
+        paginate_by = site_obj.opts.paginate_by
+        page_count = (factory.chart_info_manager.count() - 1) // paginate_by + 1 if paginate_by else 1
+        urls += ['/list/'] + [f'/list/?page={page}' for page in range(2, page_count + 1)]
+        return urls
+
+    @staticmethod
+    def page_path(output_dir, url):
+        path, _, query = url.partition('?page=')
+        if query:
+            path = f'{path}page/{query}/'
+        return output_dir / path.strip('/') / 'index.html'
+
+    @staticmethod
+    def write_frames(output_dir, name, version):
+        # 按需加载的时间轴：各帧写到与 /api/charts/<name>/<version>/frames/<index> 相同的路径，静态站点中同样可用
+        chart_dir = output_dir / 'api' / 'charts' / name
+        frames_dir = chart_dir / version / 'frames'
+        frame_count = factory.get_chart_widget(name).frame_count
+        written = 0
+        for index in range(frame_count):
+            written += write_if_changed(frames_dir / str(index), get_frame_payload(name, version, index)[0])
+        # 删除其他版本的帧（以及不再按需加载的图表的帧）
+        if chart_dir.exists():
+            for path in chart_dir.iterdir():
+                if path.name != version or not frame_count:
+                    shutil.rmtree(path)
+        return written
+
+    def handle(self, *args, **options):
+        if not options['output_dir']:
+            raise CommandError('Give an output directory or set CHARTS_PRERENDER_DIR.')
+        with fresh_charts():  # 静态页面按当前数据版本生成，不使用旧版本的图表
+            self.prerender(options)
+
+    def prerender(self, options):
+        output_dir = Path(options['output_dir'])
+        version = get_data_version()
+        written = 0
+
+        # 页面路径固定（index.html），清单中记录各页面的内容哈希，便于部署时判断哪些页面需要刷新 CDN
+        pages = {}
+        failed = []
+        for url in self.page_urls():
+            try:
+                content = self.render(url)
+            except Exception as e:
+                # 先生成其他页面与数据文件，最后以错误退出
+                self.stderr.write(f'Failed to render {url}: {e!r}')
+                failed.append(url)
+                continue
+            html = _PAGE_LINK_RE.sub(static_page_link, content.decode('utf-8')).encode('utf-8')
+            path = self.page_path(output_dir, url)
+            written += write_if_changed(path, html)
+            pages[path.relative_to(output_dir).as_posix()] = content_hash(html)
+
+        # 每个图表的完整 option 与紧凑数据，文件名带内容哈希，可被 CDN 永久缓存
+        charts = {}
+        for name in site_obj.chart_names:
+            files = {}
+            for kind, content in (
+                    ('options', factory.get_chart_widget(name).dump_options_with_quotes().encode('utf-8')),
+                    ('data', get_chart_data(name, version)[0]),
+            ):
+                relative = f'{DATA_DIR}/{name}.{kind}.{content_hash(content)}.json'
+                written += write_if_changed(output_dir / relative, content)
+                files[kind] = relative
+            charts[name] = files
+            written += self.write_frames(output_dir, name, version)
+
+        # 删除旧版本的数据文件
+        current = {relative for files in charts.values() for relative in files.values()}
+        removed = 0
+        for path in (output_dir / DATA_DIR).glob('*.json'):
+            if path.relative_to(output_dir).as_posix() not in current:
+                path.unlink()
+                removed += 1
+
+        manifest = {'version': version, 'pages': pages, 'charts': charts}
+        write_if_changed(output_dir / 'manifest.json',
+                         json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        if failed:
+            raise CommandError(f'{len(failed)} pages failed to render: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Pre-rendered {len(pages)} pages and {len(charts)} charts into {output_dir} '
+            f'({written} files written, {removed} stale files removed)'
+        ))
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from charts.site_views import site_obj
+from charts.versions import get_data_version
+from charts.warmup import warm_chart
+
+
+def warm_chart_in_thread(name, version, force):
+    try:
+        return warm_chart(name, version, force)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = ('Build every chart registered on site_obj for the current data version and store it in the render '
+            'cache. Run it after an import when the render cache is shared between processes '
+            '(e.g. CHARTS_CACHE_DIR), so no visitor pays for the rebuild.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--charts', nargs='+', help='Only warm these charts (default: all registered)')
+        parser.add_argument('--workers', type=int, help='Charts built concurrently (default: CHARTS_WARM_WORKERS)')
+        parser.add_argument('--force', action='store_true', help='Rebuild charts that are already cached')
+
+    def handle(self, *args, **options):
+        names = options['charts'] or site_obj.chart_names
+        unknown = set(names) - set(site_obj.chart_names)
+        if unknown:
+            raise CommandError(f'Unknown charts: {", ".join(sorted(unknown))}')
+        workers = options['workers'] or getattr(settings, 'CHARTS_WARM_WORKERS', 4)
+        version = get_data_version()
+
+        start = time.perf_counter()
+        if workers <= 1:
+            durations = [warm_chart(name, version, options['force']) for name in names]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                durations = list(executor.map(
+                    lambda name: warm_chart_in_thread(name, version, options['force']), names))
+
+        for name, seconds in zip(names, durations):
+            status = 'already cached' if seconds is None else f'built in {seconds * 1000:.1f}ms'
+            self.stdout.write(f'  {name:<28} {status}')
+        built = sum(seconds is not None for seconds in durations)
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {built} of {len(names)} charts for data version {version} '
+            f'in {time.perf_counter() - start:.2f}s'
+        ))
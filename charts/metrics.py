@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Sum
+
+from charts.models import Gini, IncomeData, PageView, SiteMetric
+from charts.render_cache import get_render_cache
+from charts.versions import bump_data_version, get_data_version
+
+# 首页数值面板的指标：数据指标在导入时预先计算并存入 SiteMetric 表，按数据版本缓存；
+# 页面访问次数先在内存中累计，再由后台线程批量写入 PageView 表，不会每次访问都写一次数据库。
+
+logger = logging.getLogger(__name__)
+
+# 指标名称 -> (来源模型, 字段)，取最新一个季度的值
+METRIC_SOURCES = {
+    'latest_income': (IncomeData, 'total_income'),
+    'latest_gini': (Gini, 'gini_coefficient'),
+}
+
+
+def latest_quarter_row(model, field):
+    """年季度表中最新一个季度的 (年季度, 字段值)，表为空时返回 None。"""
+    return model.objects.order_by('-year', '-quarter').values_list('year_quarter', field).first()
+
+
+def rebuild_site_metrics(models=None):
+    """重新计算来自 models（默认所有来源）的指标（在导入数据的事务中调用）。"""
+    for name, (model, field) in METRIC_SOURCES.items():
+        if models is not None and model not in models:
+            continue
+        row = latest_quarter_row(model, field)
+        if row is None:
+            SiteMetric.objects.filter(name=name).delete()
+        else:
+            SiteMetric.objects.update_or_create(name=name, defaults={'value': row[1], 'label': row[0]})
+    bump_data_version(SiteMetric)
+
+
+def get_site_metrics(version=None):
+    """返回 {指标名称: (数值, 年季度)}，按数据版本缓存，首页只读取预先计算好的几行。"""
+    if version is None:
+        version = get_data_version()
+    cache = get_render_cache()
+    key = f'charts:metrics:{version}'
+    metrics = cache.get(key)
+    if metrics is None:
+        rows = SiteMetric.objects.values_list('name', 'value', 'label')
+        metrics = {name: (value, label) for name, value, label in rows}
+        cache.set(key, metrics, timeout=None)
+    return metrics
+
+
+class PageViewBuffer:
+    """页面访问次数的内存缓冲：累计 CHARTS_PAGE_VIEW_FLUSH_SIZE 次，或距上次写入超过
+    CHARTS_PAGE_VIEW_FLUSH_INTERVAL 秒后，由后台线程在一个事务中批量写入（每个路径一条 UPDATE），
+    并重新查询访问总数；请求中只在内存中累加、读取，不访问数据库。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()  # 尚未写入数据库的访问次数
+        self.last_flush = time.monotonic()
+        self.stored_total = None  # 数据库中的访问总数，每次写入后更新
+        self.executor = None
+        self.future = None  # 已安排的后台写入，完成前不再安排新的写入
+
+    def add(self, path):
+        flush_size = getattr(settings, 'CHARTS_PAGE_VIEW_FLUSH_SIZE', 100)
+        flush_interval = getattr(settings, 'CHARTS_PAGE_VIEW_FLUSH_INTERVAL', 10)
+        with self.lock:
+            self.counts[path] += 1
+            due = (sum(self.counts.values()) >= flush_size
+                   or time.monotonic() - self.last_flush >= flush_interval)
+        if due:
+            self.schedule_flush()
+
+    def schedule_flush(self):
+        """在后台线程中调用 flush()；已经安排、尚未完成时不重复安排。"""
+        with self.lock:
+            if self.future is not None and not self.future.done():
+                return self.future
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='charts-page-views')
+            self.future = self.executor.submit(self.run_flush)
+            return self.future
+
+    def run_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Writing page views failed')
+        finally:
+            close_old_connections()  # 按 CONN_MAX_AGE 释放后台线程的数据库连接
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            self.last_flush = time.monotonic()
+        if counts:
+            with transaction.atomic():
+                for path, count in counts.items():
+                    if not PageView.objects.filter(path=path).update(count=F('count') + count):
+                        page_view, created = PageView.objects.get_or_create(path=path, defaults={'count': count})
+                        if not created:  # 其他进程刚刚创建了这一行
+                            PageView.objects.filter(path=path).update(count=F('count') + count)
+        self.stored_total = PageView.objects.aggregate(total=Sum('count'))['total'] or 0
+
+    def wait(self):
+        # 等待已安排的后台写入完成
+        future = self.future
+        if future is not None:
+            future.result()
+
+    def total(self):
+        # 数据库中的总数（最近一次后台写入时查询）加上尚未写入的次数；还没有查询过时安排一次后台写入
+        if self.stored_total is None:
+            self.schedule_flush()
+        with self.lock:
+            return (self.stored_total or 0) + sum(self.counts.values())
+
+
+page_views = PageViewBuffer()
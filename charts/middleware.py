@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from charts.instrumentation import RequestTimings, current_timings, observe_request, server_timing_header
+from charts.metrics import page_views
+from charts.warmup import warmer
+
+# 不计入访问次数的路径：后台、接口与静态文件
+EXCLUDED_PREFIXES = ('/admin/', '/api/', '/static/')
+
+
+def mark_async(middleware):
+    # 下一层是异步的（ASGI）时把中间件实例标记为协程函数，Django 直接 await 它，不再切换到线程中执行
+    if asyncio.iscoroutinefunction(middleware.get_response):
+        middleware._is_coroutine = asyncio.coroutines._is_coroutine
+
+
+class PageViewMiddleware:
+    """统计页面访问次数：只计入成功返回 HTML 的 GET 请求，计数先在内存中缓冲，再由后台线程批量写入数据库。"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        mark_async(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.count(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.count(request, response)
+        return response
+
+    def count(self, request, response):
+        # 只在内存中累加，不访问数据库
+        if (request.method == 'GET' and response.status_code == 200
+                and response.get('Content-Type', '').startswith('text/html')
+                and not request.path.startswith(EXCLUDED_PREFIXES)):
+            page_views.add(request.path)
+
+
+class RequestTimingMiddleware:
+    """统计每个请求的耗时：数据库查询、模板渲染以及各图表的构建与序列化。
+
+    开启 CHARTS_SERVER_TIMING 时写入 Server-Timing 响应头；所有请求都汇总到 /metrics 的直方图中。
+    应放在 MIDDLEWARE 的第一位，使其他中间件的查询也计入该请求。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        mark_async(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    def finish(self, request, response, timings, start):
+        timings.total = time.perf_counter() - start
+        match = request.resolver_match
+        observe_request((match.url_name or match.view_name) if match else 'unmatched', timings)
+        if getattr(settings, 'CHARTS_SERVER_TIMING', False):
+            response['Server-Timing'] = server_timing_header(timings)
+        return response
+
+    def process_template_response(self, request, response):
+        # 紧接着就是 response.render()：从现在到渲染完成的回调之间即为模板渲染耗时
+        timings = current_timings.get()
+        if timings is not None and not response.is_rendered:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add(None, 'template', time.perf_counter() - start))
+        return response
+
+
+class ChartWarmupMiddleware:
+    """网站进程加载中间件时，按 CHARTS_WARM_POLL_INTERVAL 启动后台预热的轮询线程；本身不参与请求处理。
+
+    管理命令不会加载中间件，因此只有网站进程会启动轮询线程。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        interval = getattr(settings, 'CHARTS_WARM_POLL_INTERVAL', None)
+        if interval:
+            warmer.start_polling(interval)
+        raise MiddlewareNotUsed
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:15
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+# 在添加唯一约束之前删除重复导入产生的重复行，每个自然键只保留最后导入（id 最大）的一行
+def remove_duplicates(apps, schema_editor):
+    for model_name, key_fields in (
+            ('RegionData', ('year', 'region')),
+            ('Gini', ('year_quarter',)),
+            ('IncomeData', ('year_quarter',)),
+    ):
+        model = apps.get_model('charts', model_name)
+        keep_ids = model.objects.values(*key_fields).annotate(keep_id=Max('id')).values_list('keep_id', flat=True)
+        model.objects.exclude(id__in=list(keep_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0003_incomedata'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='gini',
+            name='year_quarter',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='incomedata',
+            name='year_quarter',
+            field=models.CharField(max_length=10, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='regiondata',
+            constraint=models.UniqueConstraint(fields=('year', 'region'), name='unique_region_data_year_region'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+# 迁移中使用的省份→大区划分与名称规范化，复制自编写迁移时的 charts.regions，不随应用代码变化
+AREA_PROVINCES = {
+    "华东": ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"],
+    "华南": ["广东", "广西", "海南"],
+    "华中": ["湖北", "湖南", "河南"],
+    "华北": ["山西", "河北", "内蒙古", "北京", "天津"],
+    "东北": ["吉林", "辽宁", "黑龙江"],
+    "西北": ["新疆", "陕西", "甘肃", "宁夏", "青海"],
+    "西南": ["四川", "西藏", "贵州", "云南", "重庆"],
+}
+PROVINCE_AREA = {province: area for area, provinces in AREA_PROVINCES.items() for province in provinces}
+NAME_SUFFIXES = ("省", "市", "自治区", "壮族", "维吾尔", "回族")
+
+
+def area_of(region):
+    for suffix in NAME_SUFFIXES:
+        region = region.replace(suffix, "")
+    return PROVINCE_AREA.get(region)
+
+
+# 根据已有的 RegionData 填充大区汇总表
+def fill_area_aggregates(apps, schema_editor):
+    RegionData = apps.get_model('charts', 'RegionData')
+    AreaYearAggregate = apps.get_model('charts', 'AreaYearAggregate')
+    totals = {}
+    for region, year, metric_value in RegionData.objects.values_list('region', 'year', 'metric_value'):
+        area = area_of(region)
+        if area is not None:
+            entry = totals.setdefault((year, area), [0, 0])
+            entry[0] += metric_value
+            entry[1] += 1
+    AreaYearAggregate.objects.bulk_create([
+        AreaYearAggregate(area=area, year=year, total=total, region_count=region_count)
+        for (year, area), (total, region_count) in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0005_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaYearAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', models.CharField(max_length=20)),
+                ('year', models.IntegerField()),
+                ('total', models.BigIntegerField()),
+                ('region_count', models.IntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='areayearaggregate',
+            constraint=models.UniqueConstraint(fields=('year', 'area'), name='unique_area_year_aggregate_year_area'),
+        ),
+        migrations.RunPython(fill_area_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+# 迁移中使用的名称规范化与行政区划代码，复制自编写迁移时的 charts.regions，不随应用代码变化
+NATIONAL_CODE = "000000"
+PROVINCE_CODES = {
+    "北京": "110000", "天津": "120000", "河北": "130000", "山西": "140000", "内蒙古": "150000",
+    "辽宁": "210000", "吉林": "220000", "黑龙江": "230000",
+    "上海": "310000", "江苏": "320000", "浙江": "330000", "安徽": "340000", "福建": "350000", "江西": "360000",
+    "山东": "370000",
+    "河南": "410000", "湖北": "420000", "湖南": "430000", "广东": "440000", "广西": "450000", "海南": "460000",
+    "重庆": "500000", "四川": "510000", "贵州": "520000", "云南": "530000", "西藏": "540000",
+    "陕西": "610000", "甘肃": "620000", "青海": "630000", "宁夏": "640000", "新疆": "650000",
+    "台湾": "710000", "香港": "810000", "澳门": "820000",
+}
+NAME_SUFFIXES = ("省", "市", "自治区", "壮族", "维吾尔", "回族")
+
+
+def normalize_region(region):
+    short_name = region
+    for suffix in NAME_SUFFIXES:
+        short_name = short_name.replace(suffix, "")
+    if short_name == "全国":
+        return short_name, NATIONAL_CODE
+    return short_name, PROVINCE_CODES.get(short_name, "")
+
+
+# 为已有数据计算简称和行政区划代码：每个不同的地区名称只执行一次 UPDATE
+def fill_short_name_code(apps, schema_editor):
+    RegionData = apps.get_model('charts', 'RegionData')
+    for region in RegionData.objects.values_list('region', flat=True).distinct():
+        short_name, code = normalize_region(region)
+        RegionData.objects.filter(region=region).update(short_name=short_name, code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0006_areayearaggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regiondata',
+            name='code',
+            field=models.CharField(blank=True, db_index=True, max_length=6),
+        ),
+        migrations.AddField(
+            model_name='regiondata',
+            name='short_name',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(fill_short_name_code, migrations.RunPython.noop),
+    ]
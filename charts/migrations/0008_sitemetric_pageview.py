@@ -0,0 +1,50 @@
+# Generated by Django 3.2.20 on 2026-10-18 09:51
+
+from django.db import migrations, models
+
+# "2014_Q一" 中的季度中文数字 -> 季度序号（迁移自带，不依赖应用代码）
+QUARTER_NUMBERS = {'一': 1, '二': 2, '三': 3, '四': 4}
+
+
+def parse_year_quarter(year_quarter):
+    year, _, quarter = year_quarter.partition('_Q')
+    return int(year), QUARTER_NUMBERS[quarter]
+
+
+# 根据已有数据计算首页面板的指标（最新一个季度的人均可支配收入与基尼系数）
+def fill_site_metrics(apps, schema_editor):
+    SiteMetric = apps.get_model('charts', 'SiteMetric')
+    for name, model_name, field in (('latest_income', 'IncomeData', 'total_income'),
+                                    ('latest_gini', 'Gini', 'gini_coefficient')):
+        rows = apps.get_model('charts', model_name).objects.values_list('year_quarter', field)
+        row = max(rows, key=lambda r: parse_year_quarter(r[0]), default=None)
+        if row is not None:
+            SiteMetric.objects.create(name=name, value=row[1], label=row[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0007_regiondata_short_name_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageView',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=200, unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SiteMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.FloatField()),
+                ('label', models.CharField(blank=True, max_length=20)),
+            ],
+        ),
+        migrations.RunPython(fill_site_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.20 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+# "2014_Q一" 中的季度中文数字 -> 季度序号（迁移自带，不依赖应用代码）
+QUARTER_NUMBERS = {'一': 1, '二': 2, '三': 3, '四': 4}
+
+
+def parse_year_quarter(year_quarter):
+    year, _, quarter = year_quarter.partition('_Q')
+    return int(year), QUARTER_NUMBERS[quarter]
+
+
+# 为已有数据解析 year_quarter，填入整数的年份与季度列（按批 bulk_update）
+def fill_year_quarter(apps, schema_editor):
+    for model_name in ('Gini', 'IncomeData'):
+        model = apps.get_model('charts', model_name)
+        rows = list(model.objects.only('pk', 'year_quarter'))
+        for row in rows:
+            row.year, row.quarter = parse_year_quarter(row.year_quarter)
+        model.objects.bulk_update(rows, ['year', 'quarter'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('charts', '0008_sitemetric_pageview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gini',
+            name='quarter',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='gini',
+            name='year',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='incomedata',
+            name='quarter',
+            field=models.PositiveSmallIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='incomedata',
+            name='year',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_year_quarter, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='gini',
+            constraint=models.UniqueConstraint(fields=('year', 'quarter'), name='unique_gini_year_quarter'),
+        ),
+        migrations.AddConstraint(
+            model_name='incomedata',
+            constraint=models.UniqueConstraint(fields=('year', 'quarter'), name='unique_income_data_year_quarter'),
+        ),
+    ]
@@ -8,14 +8,24 @@ class RegionData(models.Model):
     region = models.CharField(max_length=50)
     year = models.IntegerField()
     metric_value = models.IntegerField()
+    short_name = models.CharField(max_length=20, blank=True)  # 省份简称，如 "广西"，导入时计算
+    code = models.CharField(max_length=6, blank=True, db_index=True)  # 行政区划代码，如 "450000"；全国为 "000000"
 
     def __str__(self):
         return f"{self.region} - {self.year}"
 
+    class Meta:
+        # (year, region) 唯一索引：保证重复导入不会产生重复数据，同时服务于按年份的查询
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'region'], name='unique_region_data_year_region'),
+        ]
+
 
 # csv file: income_and_inequality_metrics_national.csv
 class Gini(models.Model):
-    year_quarter = models.CharField(max_length=10)
+    year_quarter = models.CharField(max_length=10, unique=True)
+    year = models.IntegerField()  # 由 year_quarter 解析出的年份与季度序号，导入时计算
+    quarter = models.PositiveSmallIntegerField()
     gini_coefficient = models.FloatField()
     disposable_income_growth = models.FloatField()
     median_disposable_income_growth = models.FloatField()
@@ -29,11 +39,17 @@ class Gini(models.Model):
 
     class Meta:
         verbose_name_plural = "Gini Data"
+        # (year, quarter) 唯一索引：按时间排序、按年份过滤都是整数索引上的操作
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'quarter'], name='unique_gini_year_quarter'),
+        ]
 
 
 # csv disposable_income_national.csv
 class IncomeData(models.Model):
-    year_quarter = models.CharField(max_length=10)  # e.g., "2014_Q一"
+    year_quarter = models.CharField(max_length=10, unique=True)  # e.g., "2014_Q一"
+    year = models.IntegerField()  # 由 year_quarter 解析出的年份与季度序号，导入时计算
+    quarter = models.PositiveSmallIntegerField()
     total_income = models.IntegerField()
     wage_income = models.IntegerField()
     business_income = models.IntegerField()
@@ -45,3 +61,50 @@ class IncomeData(models.Model):
 
     class Meta:
         verbose_name_plural = "Income Data"
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'quarter'], name='unique_income_data_year_quarter'),
+        ]
+
+
+# 各数据表的版本号：每次导入或在后台修改数据后递增，用于使图表缓存失效
+class DataVersion(models.Model):
+    name = models.CharField(max_length=50, unique=True)  # 模型名称，如 "RegionData"
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} - v{self.version}"
+
+
+# 按大区汇总的各年收入合计，导入 RegionData 时预先计算
+class AreaYearAggregate(models.Model):
+    area = models.CharField(max_length=20)  # 大区名称，如 "华东"
+    year = models.IntegerField()
+    total = models.BigIntegerField()  # 大区内各省份 metric_value 之和
+    region_count = models.IntegerField()  # 参与汇总的省份数量
+
+    def __str__(self):
+        return f"{self.area} - {self.year}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'area'], name='unique_area_year_aggregate_year_area'),
+        ]
+
+
+# 首页数值面板的指标（如最新一个季度的人均可支配收入），导入数据时预先计算
+class SiteMetric(models.Model):
+    name = models.CharField(max_length=50, unique=True)  # 指标名称，如 "latest_income"
+    value = models.FloatField()
+    label = models.CharField(max_length=20, blank=True)  # 数据所属的年季度，如 "2021_Q四"
+
+    def __str__(self):
+        return f"{self.name} - {self.value}"
+
+
+# 页面访问次数，按路径累计；由 charts.metrics 在内存中缓冲后批量写入
+class PageView(models.Model):
+    path = models.CharField(max_length=200, unique=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.path} - {self.count}"
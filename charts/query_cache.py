@@ -0,0 +1,114 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from charts.versions import get_model_version
+
+# ORM 查询结果缓存：以 (模型, 查询形状, 表版本号) 为键，把查询结果（或由结果构建的列式存储）直接保存在进程内存中，
+# 读取时不需要像渲染缓存那样反序列化。表的版本号在 post_save、post_delete 与批量导入（data_imported 信号）时递增，
+# 旧版本的结果不再被命中；所有结果的估算大小之和超过 CHARTS_QUERY_CACHE_BYTES 时按最近最少使用淘汰。
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_MISSING = object()
+
+
+def estimate_size(value, seen=None):
+    """估算对象占用的内存（字节）：NumPy 数组按数据大小，容器与普通对象递归累加各成员。"""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        size = sys.getsizeof(value) if value.base is None else value.nbytes
+        if value.dtype == object:
+            size += sum(estimate_size(item, seen) for item in value.flat)
+        return size
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in value)
+    elif hasattr(value, '__dict__'):
+        size += estimate_size(vars(value), seen)
+    return size
+
+
+class QueryCache:
+    """按估算大小限制总量的 LRU 缓存，键的第一项为模型标签（如 "charts.Gini"），可按模型整体丢弃。"""
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # 键 -> (值, 估算大小)，最近使用的在末尾
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_max_bytes(self):
+        if self.max_bytes is not None:
+            return self.max_bytes
+        return getattr(settings, 'CHARTS_QUERY_CACHE_BYTES', DEFAULT_MAX_BYTES) or 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = estimate_size(value)
+        max_bytes = self.get_max_bytes()
+        with self.lock:
+            self._pop(key)
+            if size > max_bytes:  # 单个结果超过上限时不缓存
+                return
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def discard_model(self, label):
+        """丢弃某个模型的全部结果（该表的数据刚刚变化，旧版本的结果不会再被用到）。"""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == label]:
+                self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+query_cache = QueryCache()
+
+
+def cached_read(model, shape, load, version=None):
+    """以 (模型, 查询形状, 表版本号) 为键缓存 load() 的结果；shape 为描述查询的可哈希值，version 默认查询当前版本号。"""
+    if version is None:
+        version = get_model_version(model)
+    key = (model._meta.label, shape, version)
+    result = query_cache.get(key, _MISSING)
+    if result is _MISSING:
+        result = load()
+        query_cache.set(key, result)
+    return result
+
+
+def cached_rows(queryset, version=None):
+    """缓存查询集的全部结果（列表），查询形状取其 SQL 与参数。"""
+    sql, params = queryset.query.sql_with_params()
+    return cached_read(queryset.model, (sql, tuple(params)), lambda: list(queryset), version)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+from django.db.models import Count, Sum
+
+from charts.models import AreaYearAggregate, RegionData
+from charts.versions import bump_data_version
+
+# 大区字典：全站唯一的省份→大区划分，各图表共用
+AREA_DICT = OrderedDict([
+    ("华东", ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"]),
+    ("华南", ["广东", "广西", "海南"]),
+    ("华中", ["湖北", "湖南", "河南"]),
+    ("华北", ["山西", "河北", "内蒙古", "北京", "天津"]),
+    ("东北", ["吉林", "辽宁", "黑龙江"]),
+    ("西北", ["新疆", "陕西", "甘肃", "宁夏", "青海"]),
+    ("西南", ["四川", "西藏", "贵州", "云南", "重庆"]),
+])
+
+# 省份简称 -> 大区 的索引
+PROVINCE_AREA = {province: area for area, provinces in AREA_DICT.items() for province in provinces}
+
+# 全国的代码
+NATIONAL_CODE = "000000"
+
+# 省份简称 -> 行政区划代码（GB/T 2260）
+PROVINCE_CODES = {
+    "北京": "110000", "天津": "120000", "河北": "130000", "山西": "140000", "内蒙古": "150000",
+    "辽宁": "210000", "吉林": "220000", "黑龙江": "230000",
+    "上海": "310000", "江苏": "320000", "浙江": "330000", "安徽": "340000", "福建": "350000", "江西": "360000",
+    "山东": "370000",
+    "河南": "410000", "湖北": "420000", "湖南": "430000", "广东": "440000", "广西": "450000", "海南": "460000",
+    "重庆": "500000", "四川": "510000", "贵州": "520000", "云南": "530000", "西藏": "540000",
+    "陕西": "610000", "甘肃": "620000", "青海": "630000", "宁夏": "640000", "新疆": "650000",
+    "台湾": "710000", "香港": "810000", "澳门": "820000",
+}
+
+# 行政区划代码 -> 大区 的索引
+CODE_AREA = {PROVINCE_CODES[province]: area for province, area in PROVINCE_AREA.items()}
+
+# 省份全称中需要去掉的后缀/民族名
+_NAME_SUFFIXES = ("省", "市", "自治区", "壮族", "维吾尔", "回族")
+
+
+# 去掉省份名称中的“省”、“市”、“自治区”等，得到简称（如 "广西壮族自治区" -> "广西"）
+def short_province_name(region):
+    for suffix in _NAME_SUFFIXES:
+        region = region.replace(suffix, "")
+    return region
+
+
+# 地区全称 -> (简称, 行政区划代码)，只在导入时计算一次；无法识别的地区代码为空字符串
+def normalize_region(region):
+    short_name = short_province_name(region)
+    if short_name == "全国":
+        return short_name, NATIONAL_CODE
+    return short_name, PROVINCE_CODES.get(short_name, "")
+
+
+def rebuild_area_aggregates():
+    """根据 RegionData 重新计算 AreaYearAggregate（在导入数据的事务中调用）。"""
+    totals = OrderedDict()  # (year, area) -> [total, region_count]
+    # 先在数据库中按 (年份, 代码) 汇总，结果行数与原表大小无关
+    queryset = (
+        RegionData.objects.values_list('year', 'code')
+        .annotate(code_total=Sum('metric_value'), code_count=Count('id'))
+        .order_by('year', 'code')
+    )
+    for year, code, code_total, code_count in queryset:
+        area = CODE_AREA.get(code)
+        if area is None:
+            continue
+        entry = totals.setdefault((year, area), [0, 0])
+        entry[0] += code_total
+        entry[1] += code_count
+    AreaYearAggregate.objects.all().delete()
+    AreaYearAggregate.objects.bulk_create([
+        AreaYearAggregate(area=area, year=year, total=total, region_count=region_count)
+        for (year, area), (total, region_count) in totals.items()
+    ], batch_size=1000)
+    bump_data_version(AreaYearAggregate)
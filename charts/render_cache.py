@@ -0,0 +1,312 @@
+import json
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.urls import reverse
+from django_echarts.starter.sites import DJESite
+from pyecharts import __version__ as pyecharts_version
+from pyecharts.charts.base import Base
+from pyecharts.commons import utils
+
+from charts.instrumentation import instrumented, timed
+from charts.query_cache import cached_read
+from charts.serializer import compact_chart_options, dumps, plain
+from charts.versions import get_data_version, get_model_version
+
+# 图表渲染缓存：以 “图表名称 + 数据版本戳” 为键，缓存已经序列化好的图表 option JSON。
+# 数据只会在导入或后台修改时变化，此时版本戳递增，旧的缓存项自然失效并被 LRU 淘汰。
+
+# 缓存内容的格式版本：图表函数（含按年构建的帧）或序列化方式变化时递增，连同 pyecharts 的版本一起写入缓存键，
+# 部署新代码后，共享的文件缓存（CHARTS_CACHE_DIR）中由旧代码生成的内容不会再被取出
+RENDER_FORMAT_VERSION = 1
+RENDER_FORMAT = f'{RENDER_FORMAT_VERSION}-{pyecharts_version}'
+
+
+# 按需加载时间轴的前端脚本：第一帧随页面下发，切换到其他帧时从服务器获取并缓存，同时预取下一帧；
+# 页面所用数据版本的帧已不可用（410）时重新加载页面。
+# 取得的帧放入时间轴的 options 中（ECharts 每次 setOption 都整体替换时间轴的 options，因此总是给出完整的列表），
+# 由 ECharts 在切换到该帧时合并，而不是直接合并到 baseOption 中；该帧到达前显示加载中，不让上一帧的数据停留在新的标签下
+LAZY_TIMELINE_JS = """(function (chart, url, options) {
+    var count = options.length, loaded = {0: true}, requests = {};
+    function load(index) {
+        if (index <= 0 || index >= count) { return null; }
+        if (!requests[index]) {
+            requests[index] = fetch(url + index).then(function (response) {
+                if (response.status === 410) { window.location.reload(); }
+                if (!response.ok) { throw new Error(response.status); }
+                return response.text();
+            }).then(function (text) {
+                options[index] = new Function('return ' + text)();
+                loaded[index] = true;
+                chart.setOption({options: options.slice()});  // 正在显示该帧时 ECharts 随即合并
+            }).catch(function () {
+                delete requests[index];
+            });
+        }
+        return requests[index];
+    }
+    chart.on('timelinechanged', function (event) {
+        var index = event.currentIndex;
+        var request = load(index);
+        if (request && !loaded[index]) {
+            chart.showLoading();
+            request.then(function () {
+                if (chart.getOption().timeline[0].currentIndex === index) { chart.hideLoading(); }
+            });
+        } else {
+            chart.hideLoading();
+        }
+        load(index + 1);
+    });
+    load(1);
+})(__CHART__, '__URL__', __OPTIONS__);"""
+
+
+def get_render_cache():
+    return caches[getattr(settings, 'CHARTS_RENDER_CACHE', 'default')]
+
+
+class CachedChart(Base):
+    """已序列化的图表：只保存模板渲染所需的属性和 option JSON，可被 pickle 存入任意缓存后端。
+
+    给出 frames_url 时，帧数足够多的时间轴改为按需加载：各帧单独序列化到 frames 中，由调用方另行缓存。
+    """
+
+    def __init__(self, chart: Base, frames_url: str = None):
+        # 不调用 Base.__init__，直接复制原图表的渲染属性
+        self.chart_id = chart.chart_id
+        self.width = chart.width
+        self.height = chart.height
+        self.horizontal_center = chart.horizontal_center
+        self.renderer = chart.renderer
+        self.page_title = chart.page_title
+        self.theme = chart.theme
+        self.fill_bg = chart.fill_bg
+        self.bg_color = chart.bg_color
+        self.js_host = chart.js_host
+        self.js_functions = chart.js_functions
+        self.js_dependencies = chart.js_dependencies
+        self.render_options = chart.render_options
+        self._is_geo_chart = chart._is_geo_chart
+        self._geo_json_name = chart._geo_json_name
+        self._geo_json = chart._geo_json
+        self._render_cache = {}
+        self.options = {}
+        # 时间轴各帧相同的部分提到 baseOption 中；只序列化一次，两种格式共用同一份 JSON 文本
+        options = compact_chart_options(plain(chart.get_options()))
+        raw_json = dumps(options)
+        self._options_json = utils.replace_placeholder(raw_json)
+        self._options_json_with_quotes = utils.replace_placeholder_with_quotes(raw_json)
+        self.frames = []
+        frames = options.get('options', []) if 'baseOption' in options else []
+        min_frames = max(getattr(settings, 'CHARTS_LAZY_TIMELINE_MIN_FRAMES', None) or 2, 2)
+        if frames_url and len(frames) >= min_frames:
+            # 按需加载的时间轴：页面中只有第一帧，其余帧的位置为空，切换时由 LAZY_TIMELINE_JS 获取
+            self.frames = [utils.replace_placeholder(dumps(frame)) for frame in frames]
+            page_options = {**options, 'options': [frames[0]] + [{}] * (len(frames) - 1)}
+            self._options_json = utils.replace_placeholder(dumps(page_options))
+            # 脚本中的时间轴 options：第一帧与其余帧的占位
+            script_options = f'[{self.frames[0]}{",{}" * (len(frames) - 1)}]'
+            self.js_functions = utils.OrderedSet(*chart.js_functions.items, LAZY_TIMELINE_JS.replace(
+                '__CHART__', f'chart_{self.chart_id}').replace('__URL__', frames_url).replace(
+                '__OPTIONS__', script_options))
+        self.frame_count = len(self.frames)
+
+    def get_options(self) -> dict:
+        return json.loads(self._options_json_with_quotes)
+
+    def dump_options(self) -> str:
+        return self._options_json
+
+    def dump_options_with_quotes(self) -> str:
+        return self._options_json_with_quotes
+
+
+def render_cache_key(name, version, params=None):
+    key = f'charts:render:{RENDER_FORMAT}:{name}:{version}'
+    if params:
+        key += ':' + '&'.join(f'{k}={params[k]}' for k in sorted(params))
+    return key
+
+
+def latest_version_key(name):
+    # 该图表最近一次构建完成时的数据版本
+    return f'charts:render-latest:{RENDER_FORMAT}:{name}'
+
+
+# 已注册图表的原始函数 {名称: 函数}，后台预热时直接构建
+chart_functions = {}
+
+# 为 False 时不返回旧版本的图表：数据接口、预渲染与预热需要当前版本的数据
+serve_stale = ContextVar('charts_serve_stale', default=True)
+
+
+@contextmanager
+def fresh_charts():
+    token = serve_stale.set(False)
+    try:
+        yield
+    finally:
+        serve_stale.reset(token)
+
+
+def build_chart(name, version, func=None, kwargs=None):
+    """构建图表并写入渲染缓存，返回 CachedChart（图表函数返回 None 时为 None）。
+
+    先写入时间轴的各帧与图表本身，最后才更新最新版本，读取旧版本的请求看到的总是完整的一个版本。
+    """
+    kwargs = kwargs or {}
+    cache = get_render_cache()
+    with timed('build'):
+        chart = (func or chart_functions[name])(**kwargs)
+    if chart is None:
+        return None
+    with timed('serialize'):
+        chart = CachedChart(chart, frames_url=None if kwargs else timeline_frames_url(name, version))
+    # 时间轴的各帧单独缓存，取单独一帧时不必读出整个图表
+    cache.set_many({frame_cache_key(name, version, i): frame for i, frame in enumerate(chart.frames)},
+                   timeout=None)
+    chart.frames = []
+    cache.set(render_cache_key(name, version, kwargs), chart, timeout=None)
+    if not kwargs:
+        cache.set(latest_version_key(name), version, timeout=None)
+    return chart
+
+
+def get_stale_chart(name, version):
+    """数据版本变化后、新图表构建完成前，返回上一个版本的图表并在后台重建所有图表；没有可用的旧图表时返回 None。"""
+    if not (getattr(settings, 'CHARTS_BACKGROUND_WARMUP', False) and serve_stale.get()):
+        return None
+    cache = get_render_cache()
+    latest = cache.get(latest_version_key(name))
+    if latest is None or latest == version:
+        return None
+    chart = cache.get(render_cache_key(name, latest))
+    if chart is not None:
+        from charts.warmup import warmer  # warmup 依赖本模块，在这里导入以避免循环导入
+        warmer.warm_all(version)
+    return chart
+
+
+def cached_chart(name, func):
+    """包装图表函数：命中缓存时直接返回 CachedChart，数据刚变化时先返回旧版本（见 get_stale_chart），否则构建图表并写入缓存。"""
+
+    @wraps(func)
+    def wrapper(**kwargs):
+        cache = get_render_cache()
+        version = get_data_version()
+        with timed('cache'):
+            chart = cache.get(render_cache_key(name, version, kwargs))
+            if chart is None and not kwargs:
+                chart = get_stale_chart(name, version)
+        if chart is None:
+            chart = build_chart(name, version, func, kwargs)
+        return chart
+
+    return wrapper
+
+
+# 异步页面视图并发预取的部件 {("chart" 或 "html", 名称): 部件}，只在该请求的上下文中可见
+prefetched_widgets = ContextVar('charts_prefetched_widgets', default=None)
+
+
+def prefetchable(kind, name, func):
+    """包装部件函数：当前请求已经预取到该部件（无参数）时直接返回，不再重复构建。"""
+
+    @wraps(func)
+    def wrapper(**kwargs):
+        widgets = prefetched_widgets.get()
+        if not kwargs and widgets and (kind, name) in widgets:
+            return widgets[(kind, name)]
+        return func(**kwargs)
+
+    return wrapper
+
+
+def timeline_frames_url(name, version):
+    """按需加载时间轴各帧的地址前缀（后接帧序号），未开启按需加载时返回 None。
+
+    地址中带有构建图表时的数据版本，页面取得的各帧与页面中的第一帧总是同一个版本。
+    """
+    if not getattr(settings, 'CHARTS_LAZY_TIMELINE_MIN_FRAMES', None):
+        return None
+    return reverse('chart_frame', kwargs={'name': name, 'version': version, 'index': 0})[:-1]
+
+
+def frame_cache_key(name, version, index):
+    return f'charts:timeline-frame:{RENDER_FORMAT}:{name}:{version}:{index}'
+
+
+def get_timeline_frame(name, version, index, rebuild=True):
+    """返回时间轴第 index 帧的 option（JS 对象字面量），不存在时返回 None。
+
+    version 须为当前数据版本时才能给出 rebuild=True：重新构建只能得到当前版本的数据。
+    """
+    cache = get_render_cache()
+    key = frame_cache_key(name, version, index)
+    frame = cache.get(key)
+    if frame is None and rebuild and name in chart_functions:
+        # 帧已被 LRU 淘汰或该版本尚未构建：重新构建图表，各帧随之写入缓存
+        build_chart(name, version)
+        frame = cache.get(key)
+    return frame
+
+
+def build_year_frames(name, model, load_table, build_frame):
+    """按年份生成时间轴的每一帧，并以 (格式版本, 图表名称, 年份, 该年数据的摘要) 为键缓存。
+
+    摘要覆盖该年渲染用到的所有名称与数值，数据新增一年时只有新的一年需要构建，修改或改名的年份随之重建，
+    其余年份的帧直接从缓存中取出。load_table(version=...) 返回带 year_digests() 的整表数据
+    （列式存储或 YearIndexedTable，均按表的版本号缓存），build_frame(table, year) 返回该年的图表。
+    """
+    cache = get_render_cache()
+    version = get_model_version(model)  # 只查询一次版本号，摘要与数据共用
+    table = load_table(version=version)
+    digests = cached_read(model, ('year-digests', load_table.__qualname__), table.year_digests, version)
+    keys = OrderedDict((year, f'charts:frame:{RENDER_FORMAT}:{name}:{year}:{digest}')
+                       for year, digest in digests.items())
+    frames = cache.get_many(list(keys.values()))
+    missing = [year for year, key in keys.items() if key not in frames]
+    if missing:
+        new_frames = {keys[year]: build_frame(table, year) for year in missing}
+        cache.set_many(new_frames, timeout=None)
+        frames.update(new_frames)
+    for year, key in keys.items():
+        yield year, frames[key]
+
+
+class CachedDJESite(DJESite):
+    """注册图表时自动套上渲染缓存与耗时统计的 DJESite，图表与 HTML 部件都可由异步页面视图预取；模块中的图表函数本身保持不变。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chart_names = []  # 已注册图表的名称（按注册顺序），供基准测试等遍历
+
+    def register_chart(self, function=None, *, name: str = None, **kwargs):
+        def decorator(func):
+            cname = name or func.__name__
+            self.chart_names.append(cname)
+            chart_functions[cname] = func
+            chart_func = prefetchable('chart', cname, instrumented(cname, cached_chart(cname, func)))
+            DJESite.register_chart(self, chart_func, name=cname, **kwargs)
+            return func
+
+        if function is None:
+            return decorator
+        else:
+            return decorator(function)
+
+    def register_html_widget(self, function=None, *, name: str = None):
+        def decorator(func):
+            wname = name or func.__name__
+            DJESite.register_html_widget(self, prefetchable('html', wname, func), name=wname)
+            return func
+
+        if function is None:
+            return decorator
+        else:
+            return decorator(function)
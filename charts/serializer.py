@@ -0,0 +1,138 @@
+import json
+import math
+
+from pyecharts.charts.base import default
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：没有安装 orjson 时使用标准库 json
+    orjson = None
+
+# 图表 option 的序列化：先转换为只含基本类型的结构，时间轴各帧相同的部分提到 baseOption 中，
+# 去掉与 ECharts 默认值相同的顶层设置，再用 orjson（未安装时用标准库 json）输出紧凑的 JSON。
+
+# pyecharts 总会输出、但与 ECharts 默认值相同的顶层设置
+ECHARTS_DEFAULTS = {
+    'animation': True,
+    'animationThreshold': 2000,
+    'animationDuration': 1000,
+    'animationEasing': 'cubicOut',
+    'animationDelay': 0,
+    'animationDurationUpdate': 300,
+    'animationEasingUpdate': 'cubicOut',
+    'animationDelayUpdate': 0,
+    'aria': {'enabled': False},
+}
+
+_MISSING = object()
+
+
+def plain(value):
+    """把 pyecharts 的 option 转换为 dict/list/str/数值 组成的结构，并去掉值为 None 的键。
+
+    配置项对象、JsCode 与日期按 pyecharts 序列化时的方式转换（JsCode 变为带占位符的字符串）。
+    """
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return plain(default(value))
+
+
+def _finite(value):
+    # 标准库 json 会输出 JSON 中不合法的 NaN/Infinity，与 orjson 一样改为 null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def dumps(options):
+    """紧凑的 JSON 文本（不转义中文，NaN 输出为 null）。"""
+    if orjson is not None:
+        return orjson.dumps(options).decode('utf-8')
+    return json.dumps(_finite(options), ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+
+
+def _is_components(value):
+    # 顶层的组件列表（series、title、xAxis 等），ECharts 按下标逐个合并
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def merge_option(base, option, top=True):
+    """按 ECharts 合并 option 的方式把 option 合并到 base 上：对象逐层合并，顶层组件列表按下标合并，其余值直接替换。"""
+    merged = dict(base)
+    for key, value in option.items():
+        old = merged.get(key, _MISSING)
+        if isinstance(old, dict) and isinstance(value, dict):
+            merged[key] = merge_option(old, value, top=False)
+        elif top and _is_components(old) and _is_components(value):
+            merged[key] = [merge_option(old[i], item, top=False) if i < len(old) else item
+                           for i, item in enumerate(value)] + old[len(value):]
+        else:
+            merged[key] = value
+    return merged
+
+
+def _common_part(options, top=False):
+    # 所有 option 中取值相同的部分（对象逐层比较，顶层组件列表按下标比较）
+    first, others = options[0], options[1:]
+    common = {}
+    for key, value in first.items():
+        values = [option.get(key, _MISSING) for option in others]
+        if all(other == value for other in values):
+            common[key] = value
+        elif isinstance(value, dict) and all(isinstance(other, dict) for other in values):
+            part = _common_part([value] + values)
+            if part:
+                common[key] = part
+        elif top and _is_components(value) and all(
+                _is_components(other) and len(other) == len(value) for other in values):
+            parts = [_common_part([option[key][i] for option in options]) for i in range(len(value))]
+            # 系列必须能在 baseOption 中单独创建，因此要求共同部分带有 type
+            if any(parts) and (key != 'series' or all('type' in part for part in parts)):
+                common[key] = parts
+    return common
+
+
+def _difference(option, common, top=False):
+    # option 中与 common 不同的部分，merge_option(common, 结果) 与 option 相同
+    diff = {}
+    for key, value in option.items():
+        shared = common.get(key, _MISSING)
+        if value == shared:
+            continue
+        if isinstance(value, dict) and isinstance(shared, dict):
+            diff[key] = _difference(value, shared)
+        elif top and _is_components(value) and isinstance(shared, list):
+            diff[key] = [_difference(item, part) for item, part in zip(value, shared)]
+        else:
+            diff[key] = value
+    return diff
+
+
+def strip_defaults(options):
+    return {key: value for key, value in options.items() if ECHARTS_DEFAULTS.get(key, _MISSING) != value}
+
+
+def compact_chart_options(options):
+    """去掉默认的顶层设置；时间轴图表把各帧相同的部分提到 baseOption 中，每一帧只保留不同的部分（通常只有数据与标题文字）。
+
+    ECharts 切换时间轴时把该帧合并到当前的 option 上，因此结果与原来的 option 显示完全相同。
+    """
+    if 'baseOption' not in options:
+        return strip_defaults(options)
+    frames = [merge_option(options['baseOption'], frame) for frame in options.get('options', [])]
+    if len(frames) < 2:
+        return {**options, 'baseOption': strip_defaults(options['baseOption'])}
+    base = _common_part(frames, top=True)
+    return {
+        **options,
+        'baseOption': strip_defaults(base),
+        'options': [_difference(frame, base, top=True) for frame in frames],
+    }
@@ -1,7 +1,15 @@
+import numpy as np
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django_echarts.starter.sites import DJESite, SiteOpts
+from django_echarts.starter.sites import SiteOpts
 from pyecharts.charts import Bar, Line, Gauge, Bar3D, Map, Tree, Sunburst, TreeMap
-from charts.models import Gini, RegionData, IncomeData
+from charts.models import AreaYearAggregate, Gini, RegionData
+from charts.columnar import INCOME_FIELDS, load_gini_store, load_income_store, load_region_store
+from charts.data_access import load_area_table
+from charts.downsample import downsample_overlap, get_max_points, sampling_opts
+from charts.metrics import get_site_metrics, page_views
+from charts.regions import AREA_DICT
+from charts.render_cache import CachedDJESite, build_year_frames
 from pyecharts.charts import Timeline, Pie
 from django_echarts.stores.entity_factory import factory
 from pyecharts import options as opts
@@ -11,8 +19,8 @@ from django_echarts.entities import (
 )
 from .description import *
 
-# 创建一个DJESite对象，用于网站的配置和管理
-site_obj = DJESite(
+# 创建一个DJESite对象，用于网站的配置和管理（注册的图表会经过渲染缓存）
+site_obj = CachedDJESite(
     site_title='国民人均可支配收入可视化',  # 网站的标题
     opts=SiteOpts(
         list_layout='grid',  # 列表布局设置为网格形式
@@ -55,32 +63,35 @@ site_obj.config_nav(nav_config=nav)
     top=0,  # 定义图表的排序优先级
 )
 def bar01():  # 定义一个函数用于生成图表
-    # 从Gini模型中获取所有对象，存储为查询集
-    data = Gini.objects.all()
-
-    # 检查查询集是否有数据
-    if data.exists():
-        # 从查询集中提取x轴数据（年-季度）
-        x_data = [item.year_quarter for item in data]
-        # 从查询集中提取各种y轴数据
-        y1_data = [item.wage_income_growth for item in data]
-        y2_data = [item.business_income_growth for item in data]
-        y3_data = [item.property_income_growth for item in data]
-        y4_data = [item.transfer_income_growth for item in data]
-        y5_data = [item.disposable_income_growth for item in data]  # 假设Gini模型中该数据的字段名
+    # 从列式存储中取出Gini数据（按年季度排序）
+    data = load_gini_store()
+
+    # 检查是否有数据
+    if len(data):
+        # x轴数据（年-季度）
+        x_data = data.names()
+        # 各种y轴数据
+        y1_data = data.values('wage_income_growth')
+        y2_data = data.values('business_income_growth')
+        y3_data = data.values('property_income_growth')
+        y4_data = data.values('transfer_income_growth')
+        y5_data = data.values('disposable_income_growth')
+        # 数据点过多时降采样：折线用 LTTB 选点，柱状图按区间取平均
+        x_data, y5_data, (y1_data, y2_data, y3_data, y4_data) = downsample_overlap(
+            x_data, y5_data, [y1_data, y2_data, y3_data, y4_data], get_max_points("deposit_income_per_person"))
 
         # 创建柱状图实例
         bar = (
             Bar()
             .add_xaxis(xaxis_data=x_data)  # 添加x轴数据
             .add_yaxis(series_name="居民人均可支配工资性收入_累计增长", y_axis=y1_data,
-                       label_opts=opts.LabelOpts(is_show=False))  # 添加第一个y轴数据
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加第一个y轴数据
             .add_yaxis(series_name="居民人均可支配经营净收入_累计增长", y_axis=y2_data,
-                       label_opts=opts.LabelOpts(is_show=False))  # 添加第二个y轴数据
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加第二个y轴数据
             .add_yaxis(series_name="居民人均可支配财产净收入_累计增长", y_axis=y3_data,
-                       label_opts=opts.LabelOpts(is_show=False))  # 添加第三个y轴数据
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加第三个y轴数据
             .add_yaxis(series_name="居民人均可支配转移净收入_累计增长", y_axis=y4_data,
-                       label_opts=opts.LabelOpts(is_show=False))  # 添加第四个y轴数据
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加第四个y轴数据
             .extend_axis(  # 扩展额外的y轴
                 yaxis=opts.AxisOpts(
                     type_="value",  # 定义y轴类型
@@ -113,6 +124,7 @@ def bar01():  # 定义一个函数用于生成图表
                 yaxis_index=1,  # y轴索引
                 y_axis=y5_data,  # y轴数据
                 label_opts=opts.LabelOpts(is_show=False),  # 标签选项
+                **sampling_opts("line"),  # 客户端降采样
             )
         )
 
@@ -159,21 +171,16 @@ def create_gauge(year, gini_value):
 )
 # 定义一个函数用于创建时间轴仪表盘图表
 def create_gini_timeline():
-    years = range(2014, 2022)  # 设置年份范围
     # 初始化时间轴图表，设置图表尺寸
     timeline_gauge = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
 
-    # 遍历每一个年份
-    for year in years:
-        # 从Gini模型中获取当前年份的数据
-        data = Gini.objects.filter(year_quarter__startswith=f"{year}").values_list("year_quarter", "gini_coefficient")
+    # 生成某一年的仪表盘（取该年第一个季度的基尼系数）
+    def build_frame(gini_store, year):
+        return create_gauge(year, gini_store.values('gini_coefficient', year)[0])
 
-        # 提取基尼系数数据
-        year_data = [item[1] for item in data if item[0].startswith(str(year))]
-
-        # 如果有数据，则添加到时间轴图表中
-        if year_data:
-            timeline_gauge.add(create_gauge(year, year_data[0]), time_point=str(year))
+    # 遍历数据中实际存在的年份（已缓存的帧直接复用），添加到时间轴图表中
+    for year, gauge in build_year_frames("gini", Gini, load_gini_store, build_frame):
+        timeline_gauge.add(gauge, time_point=str(year))
 
     # 设置时间轴播放间隔
     timeline_gauge.add_schema(play_interval=1000)
@@ -189,24 +196,14 @@ def create_gini_timeline():
     top=2,  # 图表排名
 )
 def generate_Chart2():  # 定义一个函数用于生成饼图
-    def fetch_data_from_model():  # 内部函数，用于从IncomeData模型中获取数据
-        queryset = IncomeData.objects.values(  # 查询数据库
-            'year_quarter',  # 年和季度
-            'total_income',  # 总收入
-            'wage_income',  # 工资收入
-            'business_income',  # 经营收入
-            'property_income',  # 财产收入
-            'transfer_income'  # 转移收入
-        )
-        data = {}  # 初始化一个空字典用于存储数据
-        for entry in queryset:  # 遍历查询结果
-            year_quarter = entry['year_quarter']  # 获取年和季度
-            # 整理数据并存储到字典中
-            data[year_quarter] = [
-                {"name": key, "value": value}
-                for key, value in entry.items() if key != 'year_quarter'
-            ]
-        return data  # 返回整理好的数据
+    def fetch_data_from_model():  # 内部函数，用于从IncomeData的列式存储中获取数据
+        store = load_income_store()  # 按年季度排序
+        columns = [(field, store.values(field)) for field in INCOME_FIELDS]  # 各收入列
+        # 整理为 {年季度: [{"name": 字段, "value": 数值}, ...]}
+        return {
+            year_quarter: [{"name": field, "value": values[i]} for field, values in columns]
+            for i, year_quarter in enumerate(store.names())
+        }
 
     def get_year_quarter_pie_chart(year_quarter: str):  # 内部函数，用于生成特定年份和季度的饼图
         year_quarter_data = total_data[year_quarter]  # 获取特定年份和季度的数据
@@ -247,8 +244,8 @@ def generate_Chart2():  # 定义一个函数用于生成饼图
     # 创建一个时间轴实例，设置其宽度和高度
     timeline_pie = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
 
-    # 遍历所有年份和季度，为每一个生成一个饼图
-    for year_quarter in sorted(total_data.keys()):
+    # 按时间顺序遍历所有年份和季度，为每一个生成一个饼图
+    for year_quarter in total_data:
         # 调用函数生成特定年季度的饼图
         pie = get_year_quarter_pie_chart(year_quarter)
         # 将生成的饼图添加到时间轴中
@@ -268,37 +265,6 @@ def generate_Chart2():  # 定义一个函数用于生成饼图
     return timeline_pie
 
 
-# 从Django模型中获取数据并进行格式化
-def fetch_data_from_model():
-    # 使用Django的ORM从IncomeData模型中获取所需字段的值
-    queryset = IncomeData.objects.values(
-        'year_quarter',
-        'total_income',
-        'wage_income',
-        'business_income',
-        'property_income',
-        'transfer_income'
-    )
-
-    # 初始化一个空列表用于存储格式化后的数据
-    data = []
-    # 遍历查询集中的每一个条目
-    for entry in queryset:
-        # 创建一个列表，包含该条目的所有字段值
-        row = [
-            entry['year_quarter'],  # 年份和季度
-            entry['total_income'],  # 总收入
-            entry['wage_income'],  # 工资收入
-            entry['business_income'],  # 经营收入
-            entry['property_income'],  # 财产收入
-            entry['transfer_income']  # 转移收入
-        ]
-        # 将这一行数据添加到总数据列表中
-        data.append(row)
-    # 返回格式化后的数据列表
-    return data
-
-
 # 使用site_obj注册一个名为"Income_classify"的图表
 @site_obj.register_chart(
     name="Income_classify",  # 图表名称
@@ -308,26 +274,30 @@ def fetch_data_from_model():
     top=3,  # 优先级
 )
 def bar_01():  # 定义图表函数
-    data = fetch_data_from_model()  # 从模型中获取数据
+    data = load_income_store()  # 从列式存储中获取数据（按年季度排序）
     if len(data) > 0:  # 检查是否有数据
-        x_data = [item[0] for item in data]  # 获取x轴数据
-        y1_data = [float(item[2]) for item in data]  # 获取y1轴数据
-        y2_data = [float(item[3]) for item in data]  # 获取y2轴数据
-        y3_data = [float(item[4]) for item in data]  # 获取y3轴数据
-        y4_data = [float(item[5]) for item in data]  # 获取y4轴数据
+        x_data = data.names()  # 获取x轴数据
+        y1_data = data.column('wage_income').astype(float).tolist()  # 获取y1轴数据
+        y2_data = data.column('business_income').astype(float).tolist()  # 获取y2轴数据
+        y3_data = data.column('property_income').astype(float).tolist()  # 获取y3轴数据
+        y4_data = data.column('transfer_income').astype(float).tolist()  # 获取y4轴数据
+        y_total_data = data.column('total_income').astype(float).tolist()  # 获取折线数据
+        # 数据点过多时降采样：折线用 LTTB 选点，柱状图按区间取平均
+        x_data, y_total_data, (y1_data, y2_data, y3_data, y4_data) = downsample_overlap(
+            x_data, y_total_data, [y1_data, y2_data, y3_data, y4_data], get_max_points("Income_classify"))
 
         # 创建柱状图
         bar = (
             Bar()  # 初始化柱状图
             .add_xaxis(xaxis_data=x_data)  # 添加x轴数据
             .add_yaxis(series_name="居民人均可支配工资性收入_累计值", y_axis=y1_data,  # 添加y1轴数据
-                       label_opts=opts.LabelOpts(is_show=False))  # 设置标签选项
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 设置标签选项
             .add_yaxis(series_name="居民人均可支配经营净收入_累计值", y_axis=y2_data,  # 添加y2轴数据
-                       label_opts=opts.LabelOpts(is_show=False))  # 设置标签选项
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 设置标签选项
             .add_yaxis(series_name="居民人均可支配财产净收入_累计值", y_axis=y3_data,  # 添加y3轴数据
-                       label_opts=opts.LabelOpts(is_show=False))  # 设置标签选项
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 设置标签选项
             .add_yaxis(series_name="居民人均可支配转移净收入_累计值", y_axis=y4_data,  # 添加y4轴数据
-                       label_opts=opts.LabelOpts(is_show=False))  # 设置标签选项
+                       label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 设置标签选项
             .extend_axis(  # 扩展轴选项
                 yaxis=opts.AxisOpts(  # y轴选项
                     name="元",  # 单位名称
@@ -355,8 +325,9 @@ def bar_01():  # 定义图表函数
             .add_yaxis(  # 添加y轴数据
                 series_name="居民人均可支配收入_累计值",  # 系列名称
                 yaxis_index=1,  # y轴索引
-                y_axis=[float(item[1]) for item in data],  # y轴数据
+                y_axis=y_total_data,  # y轴数据
                 label_opts=opts.LabelOpts(is_show=False),  # 标签选项
+                **sampling_opts("line"),  # 客户端降采样
             )
         )
 
@@ -365,6 +336,32 @@ def bar_01():  # 定义图表函数
         print("没有查询到数据")  # 如果没有数据，则打印此消息
 
 
+# 3D柱状图中依次堆叠的收入类型（最后再加一项“总收入”）
+STACKED_INCOME_FIELDS = ('wage_income', 'business_income', 'property_income', 'transfer_income')
+
+
+def stack_income_points(income_data, max_points=None):
+    """生成3D柱状图的数据点 [季度序号, 收入类型序号, 累加值]，返回 (x轴标签, 数据点)。
+
+    数据点超过 max_points 时按年汇总（收入为年内累计值，取每年最后一个季度），仍超过时等间隔抽取年份。
+    """
+    labels = income_data.names()
+    matrix = np.column_stack([income_data.column(field) for field in STACKED_INCOME_FIELDS])
+    series_count = len(STACKED_INCOME_FIELDS) + 1
+    if max_points and len(labels) * series_count > max_points:
+        rows = income_data.year_ends()
+        labels = [str(year) for year in income_data.years]
+        step = -(-len(rows) * series_count // max_points)  # 向上取整
+        if step > 1:
+            keep = np.arange(len(rows) - 1, -1, -step)[::-1]  # 始终保留最后一年
+            rows, labels = rows[keep], [labels[i] for i in keep]
+        matrix = matrix[rows]
+    stacked = np.cumsum(matrix, axis=1)  # 逐个收入类型累加
+    stacked = np.column_stack([stacked, stacked[:, -1:]])  # 总收入项与最后一层的累加值相同
+    x, y = np.indices(stacked.shape)
+    return labels, np.column_stack([x.ravel(), y.ravel(), stacked.ravel()]).tolist()
+
+
 # 使用site_obj注册一个名为"Income_classify_3D"的图表
 @site_obj.register_chart(
     name="Income_classify_3D",  # 图表名称
@@ -375,27 +372,9 @@ def bar_01():  # 定义图表函数
 )
 def generate_Chart4():  # 定义图表函数
     try:  # 尝试执行以下代码
-        # 使用Django QuerySet API获取数据，并按年季度排序
-        income_data_objects = IncomeData.objects.all().order_by('year_quarter')
-
-        # 提取各个字段的数据
-        years_quarters = [obj.year_quarter for obj in income_data_objects]  # 年和季度
-        income_wage = [obj.wage_income for obj in income_data_objects]  # 工资收入
-        income_business = [obj.business_income for obj in income_data_objects]  # 经营收入
-        income_property = [obj.property_income for obj in income_data_objects]  # 财产收入
-        income_transfer = [obj.transfer_income for obj in income_data_objects]  # 转移收入
-
-        # 生成3D柱状图所需的数据
-        def generate_data():  # 定义数据生成函数
-            data = []  # 初始化数据列表
-            for i, yq in enumerate(years_quarters):  # 遍历年和季度
-                stack_value = 0  # 初始化堆叠值
-                for j, income_type in enumerate([income_wage, income_business, income_property, income_transfer]):  # 遍历各类型收入
-                    stack_value += income_type[i]  # 累加收入
-                    data.append([i, j, stack_value])  # 添加数据点
-                # 添加总收入项
-                data.append([i, 4, stack_value])  # 4是新的“总收入”项的y轴索引
-            return data  # 返回生成的数据
+        # 从列式存储中获取数据（按年季度的整数编码排序），数据点过多时按年汇总
+        years_quarters, data = stack_income_points(load_income_store(),
+                                                   getattr(settings, 'CHARTS_BAR3D_MAX_POINTS', None))
 
         # 初始化3D柱状图
         bar3d = Bar3D()
@@ -403,7 +382,7 @@ def generate_Chart4():  # 定义图表函数
         # 添加数据和设置选项
         bar3d.add(
             "",  # 系列名称（空）
-            generate_data(),  # 生成的数据
+            data,  # 生成的数据
             shading="lambert",  # 阴影效果
             xaxis3d_opts=opts.Axis3DOpts(data=years_quarters, type_="category"),  # x轴选项
             yaxis3d_opts=opts.Axis3DOpts(data=["工资收入", "经营收入", "财产收入", "转移收入", "总收入"], type_="category"),  # y轴选项
@@ -431,25 +410,28 @@ def generate_Chart4():  # 定义图表函数
 )
 def generate_chart3():  # 定义图表函数
     try:  # 尝试执行以下代码
-        # 使用Django QuerySet API获取数据，并按年季度排序
-        income_data_objects = IncomeData.objects.all().order_by('year_quarter')
+        # 从列式存储中获取数据（按年季度的整数编码排序）
+        income_data = load_income_store()
 
         # 提取各个字段的数据
-        x_data = [obj.year_quarter for obj in income_data_objects]  # 年和季度
-        y1_data = [obj.wage_income for obj in income_data_objects]  # 工资收入
-        y2_data = [obj.business_income for obj in income_data_objects]  # 经营收入
-        y3_data = [obj.property_income for obj in income_data_objects]  # 财产收入
-        y4_data = [obj.transfer_income for obj in income_data_objects]  # 转移收入
-        y_total_data = [obj.total_income for obj in income_data_objects]  # 总收入
+        x_data = income_data.names()  # 年和季度
+        y1_data = income_data.values('wage_income')  # 工资收入
+        y2_data = income_data.values('business_income')  # 经营收入
+        y3_data = income_data.values('property_income')  # 财产收入
+        y4_data = income_data.values('transfer_income')  # 转移收入
+        y_total_data = income_data.values('total_income')  # 总收入
+        # 数据点过多时降采样：折线用 LTTB 选点，柱状图按区间取平均
+        x_data, y_total_data, (y1_data, y2_data, y3_data, y4_data) = downsample_overlap(
+            x_data, y_total_data, [y1_data, y2_data, y3_data, y4_data], get_max_points("Income_quarter"))
 
         # 初始化柱状图
         bar = (
             Bar()
             .add_xaxis(xaxis_data=x_data)  # 添加x轴数据
-            .add_yaxis("Wage Income", y1_data, label_opts=opts.LabelOpts(is_show=False))  # 添加工资收入数据
-            .add_yaxis("Business Income", y2_data, label_opts=opts.LabelOpts(is_show=False))  # 添加经营收入数据
-            .add_yaxis("Property Income", y3_data, label_opts=opts.LabelOpts(is_show=False))  # 添加财产收入数据
-            .add_yaxis("Transfer Income", y4_data, label_opts=opts.LabelOpts(is_show=False))  # 添加转移收入数据
+            .add_yaxis("Wage Income", y1_data, label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加工资收入数据
+            .add_yaxis("Business Income", y2_data, label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加经营收入数据
+            .add_yaxis("Property Income", y3_data, label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加财产收入数据
+            .add_yaxis("Transfer Income", y4_data, label_opts=opts.LabelOpts(is_show=False), **sampling_opts("bar"))  # 添加转移收入数据
             .set_global_opts(
                 title_opts=opts.TitleOpts(title="Disposable Income National",  # 设置标题
                                           subtitle="Data sourced from relevant statistical bureau"),  # 设置副标题
@@ -463,7 +445,8 @@ def generate_chart3():  # 定义图表函数
         line = (
             Line()
             .add_xaxis(xaxis_data=x_data)  # 添加x轴数据
-            .add_yaxis("Total Income", y_total_data, label_opts=opts.LabelOpts(is_show=False))  # 添加总收入数据
+            .add_yaxis("Total Income", y_total_data, label_opts=opts.LabelOpts(is_show=False),
+                       **sampling_opts("line"))  # 添加总收入数据
         )
 
         return bar.overlap(line)  # 返回柱状图和折线图的重叠
@@ -480,35 +463,16 @@ def generate_chart3():  # 定义图表函数
     top=0,  # 顶部位置
 )
 def generate_income_timeline():  # 定义图表生成函数
-    # 从数据库获取数据并进行格式化
-    def fetch_data_from_db():
-        data = {}  # 初始化数据字典
-        # 遍历年份范围（根据数据库数据进行调整）
-        for year in range(2014, 2022):
-            queryset = RegionData.objects.filter(year=year)  # 使用Django QuerySet API获取数据
-            # 将数据存储为字典列表
-            data[year] = [{"name": obj.region, "value": obj.metric_value} for obj in queryset]
-        return data  # 返回数据
-
-    # 总数据
-    total_data = {}  # 初始化总数据字典
-    total_data["dataIncome"] = fetch_data_from_db()  # 获取并存储收入数据
-
-    # 创建时间轴对象
-    timeline = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
-
-    # 将地图添加到时间轴
-    for y in range(2014, 2022):  # 调整年份范围以匹配数据
-        sorted_year_data = total_data["dataIncome"][y]  # 获取排序后的年度数据
-        names = [x["name"] for x in sorted_year_data]  # 获取地区名称
-        values = [x["value"] for x in sorted_year_data]  # 获取地区值
-
+    # 生成某一年的地图
+    def build_frame(region_store, y):
+        provinces = region_store.column('code', y) > 0  # 只保留省级行政区（去掉 "全国" 及无法识别的地区）
         # 初始化地图对象
         map_ = (
             Map()
             .add(
                 series_name="",  # 系列名称
-                data_pair=[list(z) for z in zip(names, values)],  # 数据对
+                data_pair=[list(z) for z in zip(region_store.names(y, provinces),
+                                                region_store.values('value', y, provinces))],  # 数据对
                 maptype="china",  # 地图类型
                 is_map_symbol_show=False,  # 是否显示地图标记
             )
@@ -542,6 +506,13 @@ def generate_income_timeline():  # 定义图表生成函数
                 ),
             )
         )
+        return map_
+
+    # 创建时间轴对象
+    timeline = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
+
+    # 将数据中实际存在的每一年的地图添加到时间轴（已缓存的帧直接复用）
+    for y, map_ in build_year_frames("Income_province", RegionData, load_region_store, build_frame):
         timeline.add(map_, "{}年".format(y))  # 将地图添加到时间轴
 
     return timeline  # 返回时间轴对象
@@ -555,53 +526,31 @@ def generate_income_timeline():  # 定义图表生成函数
     top=1,  # 顶部位置
 )
 def generate_tree_timeline():  # 定义生成树形时间轴的函数
-    # 从数据库中使用RegionData模型获取数据
-    def fetch_data_from_database(year):
-        queryset = RegionData.objects.filter(year=year)
-        return [
-            {"name": obj.region, "value": obj.metric_value} for obj in queryset
-        ]
-
-    # 将数据转换为树形结构
-    def convert_to_tree_structure(year_data, area_dict):
+    # 将某一年的数据转换为树形结构（按大区序号列一次分组）
+    def convert_to_tree_structure(region_store, y):
+        names, values = region_store.names(y), region_store.values('value', y)
         tree_data = []
-        for area, provinces in area_dict.items():
-            children = []
-            for item in year_data:
-                # 去掉省份名称最后的“省”、“市”、“自治区”等
-                short_name = (item["name"].replace("省", "").replace("市", "").replace("自治区", "")
-                              .replace("壮族", "").replace("维吾尔", "").replace("回族", ""))
-                if short_name in provinces:
-                    children.append({"name": f"{item['name']} ({item['value']})"})
+        for area, rows in zip(AREA_DICT, region_store.group('area', y, len(AREA_DICT))):
+            children = [{"name": f"{names[i]} ({values[i]})"} for i in rows.tolist()]
             tree_data.append({"name": area, "children": children})
         return [{"name": "全国", "children": tree_data}]
 
-    # 大区字典（按照原代码）
-    area_dict = {
-        "华东": ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"],
-        "华南": ["广东", "广西", "海南"],
-        "华中": ["湖北", "湖南", "河南"],
-        "华北": ["山西", "河北", "内蒙古", "北京", "天津"],
-        "东北": ["吉林", "辽宁", "黑龙江"],
-        "西北": ["新疆", "陕西", "甘肃", "宁夏", "青海"],
-        "西南": ["四川", "西藏", "贵州", "云南", "重庆"]
-        # ...（其他大区）
-    }
-
-    # 创建时间轴对象
-    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))
-
-    # 生成树并添加到时间轴
-    for y in range(2014, 2022):  # 调整年份范围以匹配数据
-        year_data = fetch_data_from_database(y)  # 获取该年的数据
-        tree_data = convert_to_tree_structure(year_data, area_dict)  # 转换为树形结构
+    # 生成某一年的树形图
+    def build_frame(region_store, y):
+        tree_data = convert_to_tree_structure(region_store, y)  # 转换为树形结构
 
         # 初始化树形图
-        tree = (
+        return (
             Tree()
             .add("", tree_data, collapse_interval=2)  # 添加数据
             .set_global_opts(title_opts=opts.TitleOpts(title=f"Tree for Year {y}"))  # 设置标题
         )
+
+    # 创建时间轴对象
+    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))
+
+    # 生成树并添加到时间轴（已缓存的帧直接复用）
+    for y, tree in build_year_frames("Income_province_tree", RegionData, load_region_store, build_frame):
         timeline.add(tree, f"{y}年")  # 将树形图添加到时间轴
 
     return timeline  # 返回时间轴对象
@@ -616,31 +565,11 @@ def generate_tree_timeline():  # 定义生成树形时间轴的函数
     top=1,  # 顶部位置
 )
 def generate_province_bar():  # 定义生成省份柱形图的函数
-    # 从RegionData模型中获取数据并进行格式化
-    def get_data_from_region_data():
-        data = {}
-        for year in range(2014, 2022):  # 根据你的数据调整年份范围
-            year_data = RegionData.objects.filter(year=year)
-            data[year] = [{"name": obj.region, "value": obj.metric_value} for obj in year_data]
-        return data
-
-    # 数据排序函数
-    def format_year_data(year_data):
-        sorted_data = sorted(year_data, key=lambda x: x['value'], reverse=True)
-        return sorted_data
-
-    # 主要代码部分
-    total_data = {}  # 创建一个字典来存储数据
-    total_data["dataIncome"] = get_data_from_region_data()  # 使用获取数据的函数获取并存储数据
-
-    # 创建时间轴柱形图对象
-    timeline_bar = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
-
-    # 遍历年份生成柱形图
-    for y in range(2014, 2022):  # 根据你的数据调整年份范围
-        sorted_year_data = format_year_data(total_data["dataIncome"][y])  # 对数据进行排序
-        names = [x["name"] for x in sorted_year_data]  # 获取省份名称
-        values = [x["value"] for x in sorted_year_data]  # 获取人均可支配收入数据
+    # 生成某一年的柱形图
+    def build_frame(region_store, y):
+        order = region_store.argsort('value', y, descending=True)  # 按收入从高到低排序
+        names = region_store.names(y, order)  # 获取省份名称
+        values = region_store.values('value', y, order)  # 获取人均可支配收入数据
 
         # 初始化柱形图对象
         bar = (
@@ -658,6 +587,14 @@ def generate_province_bar():  # 定义生成省份柱形图的函数
                 toolbox_opts=opts.ToolboxOpts(is_show=True, orient="vertical", pos_left="left", pos_top="center")  # 设置工具箱选项
             )
         )
+        return bar
+
+    # 主要代码部分
+    # 创建时间轴柱形图对象
+    timeline_bar = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
+
+    # 遍历数据中实际存在的年份生成柱形图（已缓存的帧直接复用）
+    for y, bar in build_year_frames("Income_province_bar", RegionData, load_region_store, build_frame):
         timeline_bar.add(bar, time_point=str(y))  # 将柱形图添加到时间轴
 
     return timeline_bar  # 返回时间轴柱形图对象
@@ -672,60 +609,28 @@ def generate_province_bar():  # 定义生成省份柱形图的函数
     top=1,  # 顶部位置
 )
 def generate_province_pie():  # 定义生成省份饼图的函数
-    def get_data_from_region_data():  # 从RegionData模型中获取数据并进行格式化的函数
-        data = {}
-        for year in range(2014, 2022):  # 根据你的数据调整年份范围
-            year_data = RegionData.objects.filter(year=year)
-            data[year] = [{"name": obj.region, "value": obj.metric_value} for obj in year_data]
-        return data
-
-    # 按地区汇总数据的函数
-    def get_area_data(year_data):
-        area_values = {key: 0 for key in area_dict.keys()}
-        for item in year_data:
-            for area, provinces in area_dict.items():
-                if item["name"][:-1] in provinces:
-                    area_values[area] += item["value"]
-        return [{"name": area, "value": value} for area, value in area_values.items()]
-
-    # 地区和省份的定义
-    area_dict = {
-        "华东": ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"],
-        "华南": ["广东", "广西", "海南"],
-        "华中": ["湖北", "湖南", "河南"],
-        "华北": ["山西", "河北", "内蒙古", "北京", "天津"],
-        "东北": ["吉林", "辽宁", "黑龙江"],
-        "西北": ["新疆", "陕西", "甘肃", "宁夏", "青海"],
-        "西南": ["四川", "西藏", "贵州", "云南", "重庆"]
-        # ...（其他大区）
-    }
-
-    # 主要代码部分
-    total_data = {}  # 创建一个字典来存储数据
-    total_data["dataIncome"] = get_data_from_region_data()  # 使用获取数据的函数获取并存储数据
-
-    # 创建时间轴饼图对象
-    timeline_pie = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
-
-    # 遍历年份生成饼图
-    for y in range(2014, 2022):
-        sorted_year_data = get_area_data(total_data["dataIncome"][y])  # 获取按地区汇总的数据
-        names = [x["name"] for x in sorted_year_data]  # 获取地区名称
-        values = [x["value"] for x in sorted_year_data]  # 获取对应地区的收入数据
-
+    # 生成某一年的饼图（数据来自导入时预先计算的大区汇总表）
+    def build_frame(area_table, y):
         # 创建饼图对象
         pie = (
             Pie()
             .add(
                 series_name="",
-                data_pair=[list(z) for z in zip(names, values)],
+                data_pair=area_table.data_pair(y),  # 各大区的收入合计
                 radius=["20%", "40%"],  # 设置饼图半径范围
             )
             .set_global_opts(
                 title_opts=opts.TitleOpts(title="{}年按大区分类的收入分布".format(y)),  # 设置标题选项
             )
         )
+        return pie
 
+    # 主要代码部分
+    # 创建时间轴饼图对象
+    timeline_pie = Timeline(init_opts=opts.InitOpts(width="1000px", height="600px"))
+
+    # 遍历数据中实际存在的年份生成饼图（已缓存的帧直接复用）
+    for y, pie in build_year_frames("Income_province_pie", AreaYearAggregate, load_area_table, build_frame):
         timeline_pie.add(pie, time_point=str(y))  # 将饼图添加到时间轴
 
     return timeline_pie  # 返回时间轴饼图对象
@@ -740,48 +645,18 @@ def generate_province_pie():  # 定义生成省份饼图的函数
     top=1,  # 顶部位置
 )
 def generate_province_sunburst():  # 定义生成省份旭日图的函数
-    # 从 RegionData 模型中检索并格式化数据的函数
-    def get_data_from_region_data():
-        data = {}
-        for year in range(2014, 2022):  # 根据你的数据范围调整年份
-            year_data = RegionData.objects.filter(year=year)
-            data[year] = [{"name": obj.region, "value": obj.metric_value} for obj in year_data]
-        return data
-
-    # 将数据转换为旭日图结构的函数
-    def convert_to_sunburst_structure(year_data, area_dict):
+    # 将某一年的数据转换为旭日图结构的函数（按大区序号列一次分组）
+    def convert_to_sunburst_structure(region_store, y):
+        names, values = region_store.names(y), region_store.values('value', y)
         sunburst_data = []
-        for area, provinces in area_dict.items():
-            children = []
-            for item in year_data:
-                # 去掉省份名称最后的“省”、“市”、“自治区”等
-                short_name = (item["name"].replace("省", "").replace("市", "").replace("自治区", "")
-                              .replace("壮族", "").replace("维吾尔", "").replace("回族", ""))
-                if short_name in provinces:
-                    children.append({"name": f"{item['name']} ({item['value']})", "value": item['value']})
+        for area, rows in zip(AREA_DICT, region_store.group('area', y, len(AREA_DICT))):
+            children = [{"name": f"{names[i]} ({values[i]})", "value": values[i]} for i in rows.tolist()]
             sunburst_data.append({"name": area, "children": children})
         return sunburst_data
 
-    # 地区和大区定义（与你的代码相同）
-    area_dict = {
-        "华东": ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"],
-        "华南": ["广东", "广西", "海南"],
-        "华中": ["湖北", "湖南", "河南"],
-        "华北": ["山西", "河北", "内蒙古", "北京", "天津"],
-        "东北": ["吉林", "辽宁", "黑龙江"],
-        "西北": ["新疆", "陕西", "甘肃", "宁夏", "青海"],
-        "西南": ["四川", "西藏", "贵州", "云南", "重庆"]
-    }
-
-    # 主要代码部分
-    total_data = get_data_from_region_data()  # 获取数据
-
-    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))  # 创建时间轴对象
-
-    # 生成旭日图并添加到时间轴
-    for y in range(2014, 2022):  # 根据你的数据范围调整年份
-        year_data = total_data[y]  # 获取特定年份的数据
-        sunburst_data = convert_to_sunburst_structure(year_data, area_dict)  # 转换为旭日图数据结构
+    # 生成某一年的旭日图
+    def build_frame(region_store, y):
+        sunburst_data = convert_to_sunburst_structure(region_store, y)  # 转换为旭日图数据结构
 
         sunburst = (
             Sunburst(init_opts=opts.InitOpts(width="1000px", height="600px"))  # 创建旭日图对象
@@ -810,6 +685,13 @@ def generate_province_sunburst():  # 定义生成省份旭日图的函数
             )
             .set_global_opts(title_opts=opts.TitleOpts(title=f"Sunburst for Year {y}"))  # 设置标题选项
         )
+        return sunburst
+
+    # 主要代码部分
+    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))  # 创建时间轴对象
+
+    # 生成旭日图并添加到时间轴（已缓存的帧直接复用）
+    for y, sunburst in build_year_frames("Income_province_sunburst", RegionData, load_region_store, build_frame):
         timeline.add(sunburst, f"{y}年")  # 将旭日图添加到时间轴
 
     return timeline  # 返回时间轴对象
@@ -824,49 +706,18 @@ def generate_province_sunburst():  # 定义生成省份旭日图的函数
     top=1,  # 顶部位置
 )
 def generate_province_treemap():  # 定义生成省份矩形树图的函数
-    # 从 RegionData 模型中检索并格式化数据的函数
-    def get_data_from_region_data():
-        data = {}
-        for year in range(2014, 2022):  # 根据你的数据范围调整年份
-            year_data = RegionData.objects.filter(year=year)  # 从数据库获取特定年份的数据
-            data[year] = [{"name": obj.region, "value": obj.metric_value} for obj in year_data]  # 格式化数据
-        return data
-
-    # 将数据转换为树状图结构的函数
-    def convert_to_tree_map_structure(year_data, area_dict):
+    # 将某一年的数据转换为树状图结构的函数（按大区序号列一次分组）
+    def convert_to_tree_map_structure(region_store, y):
+        names, values = region_store.names(y), region_store.values('value', y)
         tree_map_data = {"children": []}  # 创建树状图数据的字典
-        for area, provinces in area_dict.items():
-            children = []
-            for item in year_data:
-                # 去掉省份名称最后的“省”、“市”、“自治区”等
-                short_name = (item["name"].replace("省", "").replace("市", "").replace("自治区", "")
-                              .replace("壮族", "").replace("维吾尔", "").replace("回族", ""))
-                if short_name in provinces:
-                    children.append({"name": f"{item['name']} ({item['value']})", "value": item['value']})
+        for area, rows in zip(AREA_DICT, region_store.group('area', y, len(AREA_DICT))):
+            children = [{"name": f"{names[i]} ({values[i]})", "value": values[i]} for i in rows.tolist()]
             tree_map_data["children"].append({"name": area, "children": children})
         return tree_map_data
 
-    # 地区和大区定义（与你的代码相同）
-    area_dict = {
-        "华东": ["江苏", "浙江", "山东", "安徽", "江西", "福建", "上海"],
-        "华南": ["广东", "广西", "海南"],
-        "华中": ["湖北", "湖南", "河南"],
-        "华北": ["山西", "河北", "内蒙古", "北京", "天津"],
-        "东北": ["吉林", "辽宁", "黑龙江"],
-        "西北": ["新疆", "陕西", "甘肃", "宁夏", "青海"],
-        "西南": ["四川", "西藏", "贵州", "云南", "重庆"]
-    }
-
-    # 主要代码部分
-    total_data = get_data_from_region_data()  # 获取数据
-
-    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))  # 创建时间轴对象
-    timeline.add_schema(pos_bottom="3%")  # 添加时间轴底部位置
-
-    # 生成树状图并添加到时间轴
-    for y in range(2014, 2022):  # 根据你的数据范围调整年份
-        year_data = total_data[y]  # 获取特定年份的数据
-        tree_map_data = convert_to_tree_map_structure(year_data, area_dict)  # 转换为树状图数据结构
+    # 生成某一年的矩形树图
+    def build_frame(region_store, y):
+        tree_map_data = convert_to_tree_map_structure(region_store, y)  # 转换为树状图数据结构
 
         tree_map = (
             TreeMap(init_opts=opts.InitOpts(width="1200px", height="720px"))  # 创建矩形树图对象
@@ -886,6 +737,14 @@ def generate_province_treemap():  # 定义生成省份矩形树图的函数
                 )
             )
         )
+        return tree_map
+
+    # 主要代码部分
+    timeline = Timeline(init_opts=opts.InitOpts(width="1200px", height="800px"))  # 创建时间轴对象
+    timeline.add_schema(pos_bottom="3%")  # 添加时间轴底部位置
+
+    # 生成树状图并添加到时间轴（已缓存的帧直接复用）
+    for y, tree_map in build_year_frames("Income_province_treemap", RegionData, load_region_store, build_frame):
         timeline.add(tree_map, f"{y}年")  # 将矩形树图添加到时间轴
 
     return timeline  # 返回时间轴对象
@@ -907,12 +766,17 @@ def generate_province_treemap():  # 定义生成省份矩形树图的函数
 
 @site_obj.register_html_widget
 def home1_panel():
+    # 数据指标在导入时预先计算并按数据版本缓存，访问次数来自内存中的计数，首页不会扫描数据表
+    metrics = get_site_metrics()
     number_p = ValuesPanel()
     number_p.add(str(factory.chart_info_manager.count()), '图表总数', '个', catalog='danger')
-    # number_p.add('42142', '网站访问量', '人次')
-    number_p.add_widget(ValueItem('114514', '网站访问量', '人次'))
-    number_p.add('78895', '国民人均可支配收入中位数', '元', catalog='info')
-    number_p.add('5.5', 'GDP增速', '%', catalog='success')
+    number_p.add_widget(ValueItem(str(page_views.total()), '网站访问量', '人次'))
+    if 'latest_income' in metrics:
+        value, year_quarter = metrics['latest_income']
+        number_p.add(f'{value:.0f}', f'居民人均可支配收入（{year_quarter}累计）', '元', catalog='info')
+    if 'latest_gini' in metrics:
+        value, year_quarter = metrics['latest_gini']
+        number_p.add(f'{value:.3f}', f'居民人均可支配收入基尼系数（{year_quarter}）', '', catalog='success')
     number_p.set_spans(6)
     return number_p
 
@@ -0,0 +1,116 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+import numpy as np
+from django.conf import settings
+
+# 列式数据的二进制快照：把各表的列式存储（定长数组 + 名称字典）写入一个文件，
+# 进程启动后以只读方式内存映射，直接作为 NumPy 数组使用，不必查询 SQLite、也不必重新构建；
+# 同一台机器上的所有 worker 共享操作系统页缓存中的同一份数据。
+#
+# 文件格式：
+#     b'CHSNAP' + 格式版本（uint16）+ 头部长度（uint32）+ JSON 头部，按 64 字节对齐
+#     各数组的原始数据，每个数组的起始位置按 64 字节对齐
+# 头部：{"tables": {表名: {"version": 数据版本号, "labels": [名称, ...],
+#                         "arrays": {"year"/"key"/列名: [dtype, 偏移, 元素个数]}}}}
+
+MAGIC = b'CHSNAP'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<6sHI')
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_snapshot(path, tables):
+    """写入快照。tables 为 {表名: (数据版本号, year, key, labels, {列名: 数组})}，数组须已按 (year, key) 排序。
+
+    先写入同一目录下的临时文件再原子替换，正在使用旧文件的进程不受影响。
+    """
+    header = {'tables': {}}
+    arrays = []
+    offset = 0
+    for name, (version, year, key, labels, columns) in tables.items():
+        entry = header['tables'][name] = {'version': version, 'labels': [str(label) for label in labels],
+                                          'arrays': {}}
+        for array_name, array in (('year', year), ('key', key), *columns.items()):
+            array = np.ascontiguousarray(array)
+            offset = _aligned(offset)
+            entry['arrays'][array_name] = [array.dtype.str, offset, len(array)]
+            arrays.append((offset, array))
+            offset += array.nbytes
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(_PREFIX.size + len(header_bytes))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for array_offset, array in arrays:
+                f.seek(data_start + array_offset)
+                f.write(array.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class Snapshot:
+    """只读内存映射的快照文件。table() 返回的数组直接引用映射的内存，不可修改。"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < _PREFIX.size:
+            raise ValueError(f'{path} is not a chart data snapshot')
+        magic, format_version, header_length = _PREFIX.unpack_from(self.buffer)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f'{path} is not a chart data snapshot (format {FORMAT_VERSION})')
+        header = json.loads(self.buffer[_PREFIX.size:_PREFIX.size + header_length].decode('utf-8'))
+        self.tables = header['tables']
+        self.data_start = _aligned(_PREFIX.size + header_length)
+
+    def versions(self):
+        return {name: table['version'] for name, table in self.tables.items()}
+
+    def table(self, name, version):
+        """(year, key, labels, {列名: 数组})；快照中没有该表或版本号不同时返回 None。"""
+        table = self.tables.get(name)
+        if table is None or table['version'] != version:
+            return None
+        arrays = {
+            array_name: np.frombuffer(self.buffer, dtype=np.dtype(dtype), count=count,
+                                      offset=self.data_start + offset)
+            for array_name, (dtype, offset, count) in table['arrays'].items()
+        }
+        year, key = arrays.pop('year'), arrays.pop('key')
+        return year, key, table['labels'], arrays
+
+
+_lock = threading.Lock()
+_current = (None, None)  # (文件标识, Snapshot)
+
+
+def get_snapshot():
+    """CHARTS_SNAPSHOT_PATH 指向的快照；文件被重新导出（inode 或修改时间变化）后重新映射，未配置或不存在时返回 None。"""
+    global _current
+    path = getattr(settings, 'CHARTS_SNAPSHOT_PATH', None)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    identity = (str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _current[0] != identity:
+            _current = (identity, Snapshot(path))
+        return _current[1]
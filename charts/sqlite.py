@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created 信号的处理函数：对新建的 SQLite 连接执行 CHARTS_SQLITE_PRAGMAS 中的 PRAGMA。"""
+    pragmas = getattr(settings, 'CHARTS_SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
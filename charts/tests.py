@@ -1,3 +1,934 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse, JsonResponse
+from django.template import TemplateDoesNotExist
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_echarts.stores.entity_factory import factory
+
+from charts import site_views, views
+from charts.columnar import GINI_FIELDS, load_gini_store, load_income_store, load_region_store, parse_year_quarter
+from charts.downsample import bucket_means, lttb_indices
+from charts.importers import BulkImporter, delete_rows, iter_batches
+from charts.management.commands.prerender_site import Command as PrerenderCommand
+from charts.instrumentation import Histogram
+from charts.metrics import PageViewBuffer, get_site_metrics
+from charts.middleware import PageViewMiddleware
+from charts.models import AreaYearAggregate, Gini, IncomeData, PageView, RegionData
+from charts.query_cache import QueryCache, cached_rows, estimate_size, query_cache
+from charts.regions import normalize_region
+from charts.render_cache import CachedChart, get_render_cache, latest_version_key, render_cache_key
+from charts.serializer import compact_chart_options, dumps, merge_option, plain
+from charts.snapshot import Snapshot, get_snapshot
+from charts.sqlite import apply_sqlite_pragmas
+from charts.versions import bump_data_version, get_data_version, get_model_version
+from charts.warmup import warmer
+
+CSV_DIR = Path(__file__).resolve().parent.parent / 'csv_data'
+
+
+# 使用仓库自带的 csv 数据初始化测试数据库
+def import_sample_data():
+    call_command('import_csv_DIBP', str(CSV_DIR / 'disposable_income_by_province.csv'), stdout=StringIO())
+    call_command('import_csv_DIN', str(CSV_DIR / 'disposable_income_national.csv'), stdout=StringIO())
+    call_command('import_csv_Gini', str(CSV_DIR / 'income_and_inequality_metrics_national.csv'), stdout=StringIO())
+
+
+class ChartQueryCountTest(TestCase):
+    """每个图表函数对每张表只查询固定次数的数据库，与年份数无关。
+
+    时间轴图表：数据版本号 + 一次取出整表数据（年份与每年的摘要由数据计算），共 2 次。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+        query_cache.clear()
+
+    def assertChartQueries(self, num, chart_func):
+        with self.assertNumQueries(num):
+            chart = chart_func()
+        self.assertIsNotNone(chart)
+        return chart
+
+    def test_income_timeline(self):
+        self.assertChartQueries(2, site_views.generate_income_timeline)
+
+    def test_tree_timeline(self):
+        self.assertChartQueries(2, site_views.generate_tree_timeline)
+
+    def test_province_bar(self):
+        self.assertChartQueries(2, site_views.generate_province_bar)
+
+    def test_province_pie(self):
+        self.assertChartQueries(2, site_views.generate_province_pie)
+
+    def test_province_sunburst(self):
+        self.assertChartQueries(2, site_views.generate_province_sunburst)
+
+    def test_province_treemap(self):
+        self.assertChartQueries(2, site_views.generate_province_treemap)
+
+    def test_gini_timeline(self):
+        chart = self.assertChartQueries(2, site_views.create_gini_timeline)
+        self.assertEqual(8, len(chart.options['options']))
+
+
+class YearAxisTest(TestCase):
+    """时间轴的年份来自数据；新增一年时只构建新的一帧。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_new_year_builds_only_new_frame(self):
+        chart = site_views.generate_income_timeline()
+        self.assertEqual([f'{y}年' for y in range(2014, 2022)], chart.options['baseOption']['timeline']['data'])
+
+        RegionData.objects.bulk_create([
+            RegionData(region='北京市', year=2022, metric_value=77415, short_name='北京', code='110000'),
+            RegionData(region='上海市', year=2022, metric_value=79610, short_name='上海', code='310000'),
+        ])
+        bump_data_version(RegionData)
+        with CaptureQueriesContext(connection) as ctx, \
+                mock.patch.object(site_views, 'Map', wraps=site_views.Map) as map_class:
+            chart = site_views.generate_income_timeline()
+        self.assertEqual(2, len(ctx.captured_queries))
+        self.assertEqual(1, map_class.call_count)  # 只构建新增年份的一帧
+        self.assertEqual(9, len(chart.options['options']))
+        self.assertEqual('2022年', chart.options['baseOption']['timeline']['data'][-1])
+
+    def test_frames_rebuilt_for_new_format(self):
+        # 部署改变了图表代码（格式版本变化）：数据不变，各帧同样重新构建
+        site_views.generate_income_timeline()
+        with mock.patch('charts.render_cache.RENDER_FORMAT', 'next'), \
+                mock.patch.object(site_views, 'Map', wraps=site_views.Map) as map_class:
+            site_views.generate_income_timeline()
+        self.assertEqual(8, map_class.call_count)
+
+    def test_changed_year_rebuilt(self):
+        site_views.generate_income_timeline()
+        # 两行数值互换：行数、合计、最大 id 都不变，只有该年的帧需要重建
+        beijing, shanghai = (RegionData.objects.get(year=2015, region=name) for name in ('北京市', '上海市'))
+        RegionData.objects.filter(pk=beijing.pk).update(metric_value=shanghai.metric_value)
+        RegionData.objects.filter(pk=shanghai.pk).update(metric_value=beijing.metric_value)
+        bump_data_version(RegionData)
+        with mock.patch.object(site_views, 'Map', wraps=site_views.Map) as map_class:
+            site_views.generate_income_timeline()
+        self.assertEqual(1, map_class.call_count)
+
+    def test_renamed_region_rebuilt(self):
+        site_views.generate_province_bar()
+        RegionData.objects.filter(year=2015, region='北京市').update(region='北京')
+        bump_data_version(RegionData)
+        self.assertIn('"北京"', json.dumps(site_views.generate_province_bar().get_options(), ensure_ascii=False, default=str))
+
+    def test_empty_table_has_no_frames(self):
+        RegionData.objects.all().delete()
+        bump_data_version(RegionData)
+        with self.assertNumQueries(2):
+            chart = site_views.generate_province_bar()
+        self.assertEqual([], chart.options['options'])
+
+
+class RenderCacheTest(TestCase):
+    """注册的图表按数据版本缓存，导入数据后缓存失效。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_second_render_served_from_cache(self):
+        chart = factory.get_chart_widget('Income_province')
+        self.assertIsInstance(chart, CachedChart)
+        with self.assertNumQueries(1):  # 只查询数据版本号
+            cached = factory.get_chart_widget('Income_province')
+        self.assertEqual(chart.dump_options(), cached.dump_options())
+
+    def test_import_bumps_data_version(self):
+        version = get_data_version()
+        call_command('import_csv_Gini', str(CSV_DIR / 'income_and_inequality_metrics_national.csv'),
+                     mode='upsert', stdout=StringIO())
+        self.assertNotEqual(version, get_data_version())
+        factory.get_chart_widget('gini')
+        with self.assertNumQueries(1):
+            factory.get_chart_widget('gini')
+
+
+class AreaAggregateTest(TestCase):
+    """大区汇总表在导入时预先计算。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def test_normalize_region(self):
+        self.assertEqual(('广西', '450000'), normalize_region('广西壮族自治区'))
+        self.assertEqual(('宁夏', '640000'), normalize_region('宁夏回族自治区'))
+        self.assertEqual(('全国', '000000'), normalize_region('全国'))
+        self.assertEqual(31, RegionData.objects.filter(year=2014).exclude(code__in=['', '000000']).count())
+
+    def test_aggregates_built_on_import(self):
+        self.assertEqual(7 * 8, AreaYearAggregate.objects.count())
+        south = AreaYearAggregate.objects.get(year=2014, area='华南')
+        self.assertEqual(3, south.region_count)  # 广东、广西、海南
+        self.assertEqual(25685 + 24669 + 17476, south.total)
+
+
+class QueryCacheTest(TestCase):
+    """查询结果按表的版本号缓存在进程内存中，逐行修改、导入都会使旧结果失效；总大小超过上限时按 LRU 淘汰。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        query_cache.clear()
+
+    def test_rows_cached_per_table_version(self):
+        queryset = Gini.objects.order_by('id').values_list('year_quarter', 'gini_coefficient')
+        rows = cached_rows(queryset)
+        with self.assertNumQueries(1):  # 只查询版本号
+            self.assertIs(rows, cached_rows(queryset))
+        version = get_model_version(Gini)
+        with self.assertNumQueries(0):  # 调用方已知版本号时不再查询
+            self.assertIs(rows, cached_rows(queryset, version=version))
+        with self.assertNumQueries(1):  # 不同的查询形状分别缓存
+            cached_rows(queryset.filter(id__gt=0), version=version)
+
+    def test_post_save_and_delete_bump_version(self):
+        store = load_gini_store()
+        row = Gini.objects.get(year_quarter='2014_Q一')
+        row.gini_coefficient = 0.5
+        row.save()
+        self.assertEqual(0.5, load_gini_store().values('gini_coefficient', 2014)[0])
+        self.assertIsNot(store, load_gini_store())
+        row.delete()
+        self.assertEqual(3, len(load_gini_store().names(2014)))
+
+    def test_import_bumps_version(self):
+        store = load_region_store()
+        call_command('import_csv_DIBP', str(CSV_DIR / 'disposable_income_by_province.csv'), mode='upsert',
+                     stdout=StringIO())
+        self.assertIsNot(store, load_region_store())
+
+    def test_size_aware_lru(self):
+        cache = QueryCache(max_bytes=3 * estimate_size(list(range(100))))
+        for i in range(3):
+            cache.set(('charts.Gini', i, 1), list(range(100)))
+        cache.get(('charts.Gini', 0, 1))
+        cache.set(('charts.Gini', 3, 1), list(range(100)))
+        self.assertIsNone(cache.get(('charts.Gini', 1, 1)))  # 最久未使用的被淘汰
+        self.assertIsNotNone(cache.get(('charts.Gini', 0, 1)))
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        cache.set(('charts.Gini', 4, 1), list(range(1000)))  # 超过上限的结果不缓存
+        self.assertIsNone(cache.get(('charts.Gini', 4, 1)))
+        cache.discard_model('charts.Gini')
+        self.assertEqual(0, cache.size)
+
+
+class SnapshotTest(TestCase):
+    """export_snapshot 把列式数据写入二进制快照；版本号一致时从内存映射的快照加载，不查询数据库。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        query_cache.clear()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / 'charts.snapshot'
+        call_command('export_snapshot', str(self.path), stdout=StringIO())
+        self.addCleanup(query_cache.clear)
+
+    def test_load_from_snapshot(self):
+        from_db = load_region_store()
+        query_cache.clear()
+        with override_settings(CHARTS_SNAPSHOT_PATH=self.path):
+            with self.assertNumQueries(1):  # 只查询数据版本号
+                store = load_region_store()
+        self.assertEqual(from_db.years, store.years)
+        self.assertEqual(from_db.names(2014), store.names(2014))
+        for name in ('value', 'code', 'area'):
+            self.assertEqual(from_db.values(name), store.values(name))
+        self.assertFalse(store.column('value').flags.writeable)  # 只读映射
+
+    def test_charts_match_database(self):
+        from_db = site_views.generate_province_bar().dump_options()
+        query_cache.clear()
+        with override_settings(CHARTS_SNAPSHOT_PATH=self.path):
+            self.assertEqual(from_db, site_views.generate_province_bar().dump_options())
+            self.assertEqual(load_gini_store().names(), [row.year_quarter for row in sorted(
+                Gini.objects.all(), key=lambda row: parse_year_quarter(row.year_quarter))])
+
+    def test_outdated_table_read_from_database(self):
+        row = IncomeData.objects.get(year_quarter='2014_Q一')
+        row.total_income = 1
+        row.save()
+        with override_settings(CHARTS_SNAPSHOT_PATH=self.path):
+            with self.assertNumQueries(2):
+                store = load_income_store()
+            self.assertEqual(1, store.values('total_income', 2014)[0])
+            with self.assertNumQueries(1):
+                load_gini_store()  # 其他表仍然使用快照
+
+    def test_reexported_after_import(self):
+        with override_settings(CHARTS_SNAPSHOT_PATH=self.path):
+            snapshot = get_snapshot()
+            call_command('import_csv_Gini', str(CSV_DIR / 'income_and_inequality_metrics_national.csv'),
+                         mode='upsert', stdout=StringIO())
+            self.assertIsNot(snapshot, get_snapshot())
+            self.assertEqual(get_model_version(Gini), get_snapshot().versions()['Gini'])
+
+    def test_invalid_file(self):
+        self.path.write_bytes(b'not a snapshot')
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+
+class ColumnStoreTest(TestCase):
+    """列式存储按数据版本整表加载一次，提供按年份切片、排序与分组。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_parse_year_quarter(self):
+        self.assertEqual((2014, 1), parse_year_quarter('2014_Q一'))
+        self.assertEqual((2021, 4), parse_year_quarter('2021_Q四'))
+        with self.assertRaises(ValueError):
+            parse_year_quarter('2014_Q5')
+
+    def test_year_quarter_columns(self):
+        # 导入时解析出整数的年份与季度，按这两列排序即为时间顺序
+        rows = list(IncomeData.objects.order_by('year', 'quarter').values_list('year_quarter', 'year', 'quarter'))
+        self.assertEqual(('2014_Q三', 2014, 3), rows[2])
+        self.assertEqual([parse_year_quarter(row[0]) for row in rows], [row[1:] for row in rows])
+        self.assertEqual('2021_Q四', get_site_metrics()['latest_gini'][1])
+        self.assertEqual(4, Gini.objects.filter(year=2015).count())
+
+    def test_quarters_in_time_order(self):
+        store = load_income_store()
+        self.assertEqual(['2014_Q一', '2014_Q二', '2014_Q三', '2014_Q四'], store.names(2014))
+        self.assertEqual(store.column('quarter').tolist(), sorted(store.column('quarter').tolist()))
+        self.assertEqual(list(range(2014, 2022)), load_gini_store().years)
+
+    def test_store_cached_per_version(self):
+        load_region_store()
+        with self.assertNumQueries(1):  # 只查询数据版本号
+            store = load_region_store()
+        bump_data_version(RegionData)
+        with self.assertNumQueries(2):
+            self.assertIsNot(store, load_region_store())
+
+    def test_sort_and_group(self):
+        store = load_region_store()
+        order = store.argsort('value', 2014, descending=True)
+        self.assertEqual('北京市', store.names(2014, order)[1])  # 第一名为上海市
+        values = store.values('value', 2014, order)
+        self.assertEqual(sorted(values, reverse=True), values)
+        groups = dict(zip(site_views.AREA_DICT, store.group('area', 2014, len(site_views.AREA_DICT))))
+        self.assertEqual(3, len(groups['华南']))
+        self.assertEqual(31, sum(len(rows) for rows in groups.values()))  # 不含 "全国"
+
+    def test_bar3d_points(self):
+        store = load_income_store()
+        labels, data = site_views.stack_income_points(store)
+        self.assertEqual(32, len(labels))
+        first = IncomeData.objects.get(year_quarter='2014_Q一')
+        total = first.wage_income + first.business_income + first.property_income + first.transfer_income
+        self.assertEqual([[0, 3, total], [0, 4, total]], data[3:5])
+
+        # 超过上限时按年汇总，取每年最后一个季度的累计值
+        labels, data = site_views.stack_income_points(store, max_points=50)
+        self.assertEqual([str(year) for year in range(2014, 2022)], labels)
+        self.assertEqual(IncomeData.objects.get(year_quarter='2014_Q四').wage_income, data[0][2])
+
+        # 仍超过上限时等间隔抽取年份，保留最后一年
+        labels, data = site_views.stack_income_points(store, max_points=20)
+        self.assertEqual(['2015', '2017', '2019', '2021'], labels)
+        self.assertEqual(20, len(data))
+
+
+class DownsampleTest(TestCase):
+    """长序列在服务端降采样：折线用 LTTB 选点，柱状图按区间取平均。"""
+
+    def test_lttb_keeps_ends_and_peak(self):
+        values = [0.0] * 100
+        values[37] = 50.0
+        index = lttb_indices(values, 10)
+        self.assertEqual(10, len(index))
+        self.assertEqual([0, 99], [index[0], index[-1]])
+        self.assertIn(37, index.tolist())
+        self.assertEqual(list(range(5)), lttb_indices(range(5), 10).tolist())
+
+    def test_bucket_means(self):
+        self.assertEqual([1.0, 3.0, 5.5], bucket_means([1, 2, 4, 5, 6], [0, 2, 4]).tolist())
+
+    @override_settings(CHARTS_MAX_POINTS={'Income_quarter': 10}, CHARTS_CLIENT_SAMPLING=True)
+    def test_chart_downsampled(self):
+        import_sample_data()
+        options = site_views.generate_chart3().options
+        labels = options['xAxis'][0]['data']
+        self.assertEqual(10, len(labels))
+        self.assertEqual(['2014_Q一', '2021_Q四'], [labels[0], labels[-1]])
+        for series in options['series']:
+            self.assertEqual(10, len(series['data']))
+        self.assertEqual('lttb', options['series'][-1]['sampling'])
+        self.assertTrue(options['series'][0]['large'])
+
+
+class AsyncPageTest(TransactionTestCase):
+    """首页与合辑页由异步视图渲染，需要的部件先并发取得，渲染时不再重复构建。"""
+
+    def setUp(self):
+        import_sample_data()
+        get_render_cache().clear()
+
+    def test_home_prefetches_widgets(self):
+        self.assertEqual([('chart', 'Income_classify_pie'), ('html', 'home1_panel')], views.home_widget_refs())
+        with mock.patch.object(views, 'load_widget', wraps=views.load_widget) as load_widget:
+            response = self.client.get('/')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, load_widget.call_count)
+        self.assertIn('"value":5562', response.content.decode('utf-8'))  # 饼图第一个季度的总收入
+
+    def test_collection_refs(self):
+        self.assertEqual(site_views.site_obj.chart_names,
+                         [name for _, name in views.collection_widget_refs()][:len(site_views.site_obj.chart_names)])
+        self.assertEqual([], views.collection_widget_refs('missing'))
+
+
+class ConcurrentPrefetchTest(TransactionTestCase):
+    """部件在线程池中并发取得，各线程使用自己的数据库连接。"""
+
+    def setUp(self):
+        import_sample_data()
+        get_render_cache().clear()
+
+    def test_collection_page_loads_charts_concurrently(self):
+        names = site_views.site_obj.chart_names
+        with mock.patch.object(views, 'load_widget_in_thread', wraps=views.load_widget_in_thread) as load:
+            widgets = async_to_sync(views.prefetch_widgets)([('chart', name) for name in names])
+        self.assertEqual(len(names), load.call_count)
+        self.assertTrue(all(isinstance(widgets[('chart', name)], CachedChart) for name in names))
+        with self.assertNumQueries(1):  # 已经缓存：只查询数据版本号
+            factory.get_chart_widget(names[0])
+
+
+def gini_row(year_quarter, value=0.4):
+    year, quarter = parse_year_quarter(year_quarter)
+    return Gini(year_quarter=year_quarter, year=year, quarter=quarter, **{field: value for field in GINI_FIELDS})
+
+
+class BulkImporterTest(TestCase):
+    """BulkImporter 按批次写入：append 直接插入，upsert 按自然键更新或插入，replace 先清空表，计数与写入的行一致。"""
+
+    def assertStatements(self, counts, queries):
+        # 按语句类型统计对 charts_gini 表的查询次数
+        statements = [query['sql'].split()[0] for query in queries.captured_queries
+                      if '"charts_gini"' in query['sql']]
+        self.assertEqual(counts, {kind: statements.count(kind) for kind in counts})
+
+    def test_iter_batches(self):
+        self.assertEqual([[0, 1], [2, 3], [4]], list(iter_batches(iter(range(5)), 2)))
+        self.assertEqual([], list(iter_batches([], 2)))
+
+    def test_append_in_batches(self):
+        importer = BulkImporter(Gini, ('year_quarter',), batch_size=2)
+        rows = [gini_row(f'2014_Q{q}') for q in '一二三四'] + [gini_row('2015_Q一')]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(5, importer.run(rows))
+        self.assertStatements({'INSERT': 3, 'SELECT': 0, 'UPDATE': 0}, queries)
+        self.assertEqual((5, 5, 0), (importer.row_count, importer.created_count, importer.updated_count))
+        self.assertEqual(5, Gini.objects.count())
+        with self.assertRaises(IntegrityError):  # append 不检查已有的行
+            BulkImporter(Gini, ('year_quarter',)).run([gini_row('2014_Q一')])
+
+    def test_upsert_updates_by_natural_key(self):
+        BulkImporter(Gini, ('year_quarter',)).run([gini_row('2014_Q一'), gini_row('2014_Q二')])
+        importer = BulkImporter(Gini, ('year_quarter',), mode='upsert', batch_size=10)
+        rows = [gini_row('2014_Q一', 0.45), gini_row('2014_Q三', 0.46), gini_row('2014_Q三', 0.47)]
+        with CaptureQueriesContext(connection) as queries:
+            importer.run(rows)
+        # 每批一次 SELECT 找出已有的行，新行一条 INSERT，已有的行一条 UPDATE
+        self.assertStatements({'SELECT': 1, 'INSERT': 1, 'UPDATE': 1}, queries)
+        self.assertEqual((3, 1, 1), (importer.row_count, importer.created_count, importer.updated_count))
+        values = dict(Gini.objects.values_list('year_quarter', 'gini_coefficient'))
+        # 已有的行被更新，未出现的行保留，同一批次中的重复键以最后一行为准
+        self.assertEqual({'2014_Q一': 0.45, '2014_Q二': 0.4, '2014_Q三': 0.47}, values)
+
+    def test_upsert_batch_larger_than_parameter_limit(self):
+        # 一批 1500 行、两个键字段：已有行的查询按 SQLite 的 999 个参数分块，只取出键完全匹配的行
+        rows = [RegionData(region=f'地区{i}', year=2000 + i % 3, metric_value=i) for i in range(1500)]
+        BulkImporter(RegionData, ('year', 'region')).run(rows[::2])
+        RegionData.objects.create(region='地区1', year=2000, metric_value=-1)  # 与某行的年份、地区分别相同，但不是同一行
+        importer = BulkImporter(RegionData, ('year', 'region'), mode='upsert', batch_size=1500)
+        with CaptureQueriesContext(connection) as queries:
+            importer.run([RegionData(region=row.region, year=row.year, metric_value=row.metric_value + 1)
+                          for row in rows])
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(4, len(selects))  # 1500 个键 / 每次 499 个
+        self.assertEqual((1500, 750, 750), (importer.row_count, importer.created_count, importer.updated_count))
+        self.assertEqual(1501, RegionData.objects.count())
+        self.assertEqual(-1, RegionData.objects.get(region='地区1', year=2000).metric_value)
+        self.assertEqual(2, RegionData.objects.get(region='地区1', year=2001).metric_value)
+
+    def test_replace_clears_table(self):
+        BulkImporter(Gini, ('year_quarter',)).run([gini_row('2014_Q一'), gini_row('2014_Q二')])
+        importer = BulkImporter(Gini, ('year_quarter',), mode='replace')
+        importer.run([gini_row('2014_Q二', 0.45), gini_row('2014_Q三')])
+        self.assertEqual((2, 2, 0), (importer.row_count, importer.created_count, importer.updated_count))
+        self.assertEqual({'2014_Q二': 0.45, '2014_Q三': 0.4},
+                         dict(Gini.objects.values_list('year_quarter', 'gini_coefficient')))
+
+    def test_replace_deletes_in_one_statement(self):
+        BulkImporter(Gini, ('year_quarter',)).run([gini_row(f'{year}_Q一') for year in range(2000, 2100)])
+        version = get_model_version(Gini)
+        # 删除不逐行发送 post_delete：保存点、一条 DELETE、一条 INSERT、递增一次版本号、释放保存点
+        with self.assertNumQueries(5):
+            BulkImporter(Gini, ('year_quarter',), mode='replace').run([gini_row('2014_Q一')])
+        self.assertEqual(version + 1, get_model_version(Gini))
+        self.assertEqual(1, Gini.objects.count())
+
+    def test_admin_bulk_delete_bumps_once(self):
+        BulkImporter(Gini, ('year_quarter',)).run([gini_row(f'{year}_Q一') for year in range(2000, 2010)])
+        version = get_model_version(Gini)
+        admin.site._registry[Gini].delete_queryset(None, Gini.objects.filter(year__lt=2005))
+        self.assertEqual(version + 1, get_model_version(Gini))
+        self.assertEqual(5, Gini.objects.count())
+
+    def test_delete_rows(self):
+        BulkImporter(Gini, ('year_quarter',)).run([gini_row(f'{year}_Q一') for year in range(2000, 2010)])
+        with self.assertNumQueries(1):
+            self.assertEqual(3, delete_rows(Gini.objects.filter(year__gte=2007)))
+        self.assertEqual(7, delete_rows(Gini.objects.all()))
+        with self.assertRaises(ValueError):  # 被外键引用的表需要级联删除
+            delete_rows(User.objects.all())
+
+
+class StreamingImportTest(TestCase):
+    """宽表 csv 可以是压缩文件，空单元格被跳过。"""
+
+    def test_import_gzip_wide_csv(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'wide.csv.gz'
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                f.write('年份,全国,北京市,广西壮族自治区\n2014,20167,44489,\n2015,21966,48458,16873\n')
+            call_command('import_csv_DIBP', str(path), chunk_size=2, stdout=StringIO())
+        self.assertEqual(5, RegionData.objects.count())
+        self.assertEqual('450000', RegionData.objects.get(year=2015, short_name='广西').code)
+        self.assertEqual(44489, AreaYearAggregate.objects.get(year=2014, area='华北').total)
+
+
+class ImportAllTest(TestCase):
+    """import_all 按表头识别目录中的各个 csv 文件，并行解析后统一写入。"""
+
+    def test_import_directory(self):
+        call_command('import_all', str(CSV_DIR), workers=2, chunk_size=50, stdout=StringIO())
+        self.assertEqual(256, RegionData.objects.count())
+        self.assertEqual(7 * 8, AreaYearAggregate.objects.count())
+        self.assertEqual(32, Gini.objects.count())
+        self.assertEqual(32, IncomeData.objects.count())
+        with self.assertRaises(CommandError):
+            call_command('import_all', str(CSV_DIR), workers=2, stdout=StringIO())
+
+    def test_concurrent_writers_append_only(self):
+        for mode in ('upsert', 'replace'):
+            with self.assertRaisesMessage(CommandError, 'append'):
+                call_command('import_all', str(CSV_DIR), writers=2, mode=mode, stdout=StringIO())
+        self.assertEqual(0, RegionData.objects.count())
+
+
+class BenchmarkCommandTest(TestCase):
+    """benchmark_charts 为每个注册的图表输出报告，模拟数据在结束后回滚。"""
+
+    def test_benchmark_report(self):
+        import_sample_data()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = Path(tmp_dir) / 'benchmark.json'
+            call_command('benchmark_charts', scales='2x40', repeat=2, output=str(output), stdout=StringIO())
+            report = json.loads(output.read_text(encoding='utf-8'))
+        results = {r['chart']: r for r in report['results']}
+        # 每次无缓存的运行都重新查询数据：数据版本 + 表版本 + 整表数据
+        self.assertEqual(3, results['Income_province_bar']['cold_queries'])
+        self.assertEqual(site_views.site_obj.chart_names, [r['chart'] for r in report['results']])
+        self.assertTrue(all(r['json_bytes'] > 0 for r in report['results']))
+        self.assertEqual(256, RegionData.objects.count())
+
+
+class ChartDataApiTest(TestCase):
+    """/api/charts/<name>/data 返回紧凑的系列数据，ETag 随数据版本变化。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/charts/Income_province/data')
+        self.assertEqual(200, response.status_code)
+        data = json.loads(response.content)
+        self.assertEqual(8, len(data['frames']))
+        self.assertEqual('map', data['frames'][0]['series'][0]['type'])
+        etag = response['ETag']
+        with self.assertNumQueries(1):  # 只查询数据版本号
+            response = self.client.get('/api/charts/Income_province/data', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        bump_data_version(RegionData)
+        response = self.client.get('/api/charts/Income_province/data', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response['ETag'])
+
+    def test_gzip(self):
+        response = self.client.get('/api/charts/Income_classify/data', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertTrue(response['ETag'].endswith('-gzip"'))
+        self.assertIn('series', json.loads(gzip.decompress(response.content)))
+
+    def test_unknown_chart(self):
+        self.assertEqual(404, self.client.get('/api/charts/unknown/data').status_code)
+
+
+class PrerenderSiteTest(TransactionTestCase):
+    """prerender_site 输出静态页面与带内容哈希的数据文件；配置输出目录后导入数据会自动重新生成。"""
+
+    def setUp(self):
+        import_sample_data()
+
+    def test_prerender_after_import(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with override_settings(CHARTS_PRERENDER_DIR=tmp_dir):
+                call_command('import_csv_Gini', str(CSV_DIR / 'income_and_inequality_metrics_national.csv'),
+                             mode='upsert', stdout=StringIO())
+            output = Path(tmp_dir)
+            manifest = json.loads((output / 'manifest.json').read_text(encoding='utf-8'))
+            self.assertEqual(get_data_version(), manifest['version'])
+            self.assertIn('chart/gini/index.html', manifest['pages'])
+            data_file = output / manifest['charts']['gini']['data']
+            self.assertRegex(data_file.name, r'^gini\.data\.[0-9a-f]{12}\.json$')
+            self.assertEqual(8, len(json.loads(data_file.read_text(encoding='utf-8'))['frames']))
+            list_html = (output / 'list' / 'index.html').read_text(encoding='utf-8')
+            self.assertIn('/list/page/2/', list_html)
+            self.assertNotIn('?page=', list_html)
+            self.assertRegex(manifest['pages']['list/index.html'], r'^[0-9a-f]{12}$')
+
+    def test_failed_page(self):
+        def render(command, url):
+            if url == '/collection/':
+                raise TemplateDoesNotExist('chart_collection.html')
+            return original(command, url)
+
+        original = PrerenderCommand.render
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(PrerenderCommand, 'render', render):
+            with self.assertRaisesMessage(CommandError, '1 pages failed to render: /collection/'):
+                call_command('prerender_site', tmp_dir, stdout=StringIO(), stderr=StringIO())
+            # 其他页面与数据文件照常生成
+            self.assertTrue((Path(tmp_dir) / 'chart' / 'gini' / 'index.html').exists())
+
+
+class LazyTimelineTest(TestCase):
+    """按需加载的时间轴：页面只包含第一帧，其余帧由 /api/charts/<name>/<version>/frames/<index> 提供。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_page_has_only_first_frame(self):
+        chart = factory.get_chart_widget('Income_classify_pie')
+        frames = json.loads(chart.dump_options_with_quotes())['options']
+        self.assertEqual(32, chart.frame_count)
+        self.assertEqual(32, len(frames))  # 完整的 option 仍供数据接口使用
+        script = chart.js_functions.items[-1]
+        self.assertIn(f"'/api/charts/Income_classify_pie/{get_data_version()}/frames/', [", script)
+        # 脚本中的时间轴 options：第一帧与 31 个占位，取得的帧放入其中，不直接合并到 baseOption
+        self.assertTrue(script.endswith(',{}' * 31 + ']);'))
+        self.assertIn('chart.setOption({options: options.slice()})', script)
+        page_frames = json.loads(chart.dump_options())['options']
+        self.assertEqual(frames[0], page_frames[0])
+        self.assertEqual([{}] * 31, page_frames[1:])
+
+    def test_frame_endpoint(self):
+        url = f'/api/charts/Income_classify_pie/{get_data_version()}/frames/'
+        response = self.client.get(url + '5')
+        self.assertEqual(200, response.status_code)
+        frame = json.loads(response.content)
+        self.assertEqual(['series'], list(frame))  # 只有该帧的数据，系列的类型与样式在 baseOption 中
+        self.assertNotIn('type', frame['series'][0])
+        self.assertEqual(304, self.client.get(url + '5', HTTP_IF_NONE_MATCH=response['ETag']).status_code)
+        self.assertEqual(404, self.client.get(url + '32').status_code)
+        self.assertEqual(404, self.client.get(f'/api/charts/Income_classify/{get_data_version()}/frames/1').status_code)
+
+    def test_evicted_frame_is_rebuilt(self):
+        factory.get_chart_widget('gini')
+        get_render_cache().clear()
+        self.assertEqual(200, self.client.get(f'/api/charts/gini/{get_data_version()}/frames/7').status_code)
+
+    @override_settings(CHARTS_BACKGROUND_WARMUP=False)
+    def test_frames_of_rendered_version(self):
+        # 页面在版本 V 渲染，之后数据变化：页面仍取得版本 V 的帧，V 的帧不可用时返回 410，而不是其他版本的帧
+        old_version = get_data_version()
+        old_frame = self.client.get(f'/api/charts/gini/{old_version}/frames/7').content
+        Gini.objects.filter(year=2021).update(gini_coefficient=0.9)
+        bump_data_version(Gini)
+        version = get_data_version()
+        self.assertIn(f"'/api/charts/gini/{version}/frames/'", factory.get_chart_widget('gini').js_functions.items[-1])
+        self.assertEqual(old_frame, self.client.get(f'/api/charts/gini/{old_version}/frames/7').content)
+        self.assertNotEqual(old_frame, self.client.get(f'/api/charts/gini/{version}/frames/7').content)
+        get_render_cache().clear()
+        self.assertEqual(410, self.client.get(f'/api/charts/gini/{old_version}/frames/7').status_code)
+        self.assertEqual(200, self.client.get(f'/api/charts/gini/{version}/frames/7').status_code)
+
+    @override_settings(CHARTS_LAZY_TIMELINE_MIN_FRAMES=None)
+    def test_disabled(self):
+        chart = factory.get_chart_widget('gini')
+        self.assertEqual(0, chart.frame_count)
+        self.assertEqual(8, len(json.loads(chart.dump_options())['options']))
+
+
+class SiteMetricTest(TestCase):
+    """首页面板的指标在导入时计算并按数据版本缓存；访问次数批量写入数据库。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def setUp(self):
+        get_render_cache().clear()
+
+    def test_metrics_rebuilt_on_import(self):
+        metrics = get_site_metrics()
+        self.assertEqual('2021_Q四', metrics['latest_income'][1])
+        self.assertEqual('2021_Q四', metrics['latest_gini'][1])
+        Gini.objects.filter(year_quarter='2021_Q四').update(gini_coefficient=0.5)
+        call_command('import_csv_Gini', str(CSV_DIR / 'income_and_inequality_metrics_national.csv'),
+                     mode='upsert', stdout=StringIO())
+        self.assertNotEqual(0.5, get_site_metrics()['latest_gini'][0])
+        with self.assertNumQueries(1):  # 只查询数据版本号
+            get_site_metrics()
+
+    def test_middleware_counts_html_pages_only(self):
+        requests = RequestFactory()
+        with mock.patch('charts.middleware.page_views') as page_views:
+            PageViewMiddleware(lambda request: HttpResponse('<html></html>'))(requests.get('/list/'))
+            PageViewMiddleware(lambda request: HttpResponse('<html></html>'))(requests.post('/list/'))
+            PageViewMiddleware(lambda request: JsonResponse({}))(requests.get('/list/'))
+            PageViewMiddleware(lambda request: HttpResponse(status=404))(requests.get('/missing/'))
+            PageViewMiddleware(lambda request: HttpResponse('<html></html>'))(requests.get('/admin/'))
+        page_views.add.assert_called_once_with('/list/')
+
+    def test_async_middleware(self):
+        async def get_response(request):
+            return HttpResponse('<html></html>')
+
+        middleware = PageViewMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        with mock.patch('charts.middleware.page_views') as page_views:
+            async_to_sync(middleware)(RequestFactory().get('/list/'))
+        page_views.add.assert_called_once_with('/list/')
+
+
+class PageViewBufferTest(TransactionTestCase):
+    """访问次数由后台线程批量写入数据库，请求中不访问数据库。"""
+
+    @override_settings(CHARTS_PAGE_VIEW_FLUSH_SIZE=3, CHARTS_PAGE_VIEW_FLUSH_INTERVAL=3600)
+    def test_page_views_flushed_in_batches(self):
+        buffer = PageViewBuffer()
+        with self.assertNumQueries(0):  # 总数在后台线程中查询
+            self.assertEqual(0, buffer.total())
+        buffer.wait()
+        buffer.add('/')
+        buffer.add('/list/')
+        self.assertEqual(0, PageView.objects.count())
+        self.assertEqual(2, buffer.total())
+        with self.assertNumQueries(0):
+            buffer.add('/')
+        buffer.wait()
+        self.assertEqual(2, PageView.objects.get(path='/').count)
+        self.assertEqual(1, PageView.objects.get(path='/list/').count)
+        self.assertEqual(3, buffer.total())
+
+
+class RequestTimingTest(TransactionTestCase):
+    """Server-Timing 响应头给出各图表的耗时，/metrics 以 Prometheus 文本格式输出直方图。"""
+
+    def setUp(self):
+        import_sample_data()
+        get_render_cache().clear()
+
+    def test_server_timing_header(self):
+        timing = self.client.get('/chart/gini/')['Server-Timing']
+        for entry in ('total;dur=', 'template;dur=', 'chart.gini.build;dur=', 'chart.gini.serialize;dur='):
+            self.assertIn(entry, timing)
+        self.assertRegex(timing, r'chart\.gini\.db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+        # 第二次命中渲染缓存，不再构建
+        self.assertNotIn('chart.gini.build', self.client.get('/chart/gini/')['Server-Timing'])
+        # 异步首页：预取的图表同样计时，模板在视图中渲染
+        timing = self.client.get('/')['Server-Timing']
+        self.assertRegex(timing, r'chart\.\w+\.build;dur=')
+        self.assertNotRegex(timing, r'template;dur=0\.0(,|$)')
+
+    async def test_async_request(self):
+        # ASGI 下中间件链是异步的，同步视图在其他线程中执行的查询同样计入
+        response = await self.async_client.get('/chart/gini/')
+        self.assertRegex(response['Server-Timing'], r'chart\.gini\.db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+
+    def test_metrics_endpoint(self):
+        self.client.get('/chart/gini/')
+        response = self.client.get('/metrics')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode('utf-8')
+        self.assertIn('# TYPE charts_chart_phase_seconds histogram', body)
+        self.assertIn('charts_chart_phase_seconds_bucket{chart="gini",phase="build",le="+Inf"}', body)
+        self.assertRegex(body, r'charts_chart_db_queries_total\{chart="gini"\} [1-9]')
+
+    def test_metrics_access(self):
+        with override_settings(CHARTS_METRICS_ENABLED=False):
+            self.assertEqual(404, self.client.get('/metrics').status_code)
+        self.assertEqual(403, self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code)
+        self.client.force_login(User.objects.create(username='admin', is_staff=True))
+        self.assertEqual(200, self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 3):
+            histogram.observe(('home',), value)
+        self.assertEqual([
+            'test_seconds_bucket{view="home",le="0.1"} 1',
+            'test_seconds_bucket{view="home",le="1"} 3',
+            'test_seconds_bucket{view="home",le="+Inf"} 4',
+            'test_seconds_sum{view="home"} 4.05',
+            'test_seconds_count{view="home"} 4',
+        ], list(histogram.samples()))
+
+
+class SqlitePragmaTest(TestCase):
+    """CHARTS_SQLITE_PRAGMAS 中的 PRAGMA 在新建连接时执行，未设置时不做任何事。"""
+
+    def cache_size(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            return cursor.fetchone()[0]
+
+    def test_apply_pragmas(self):
+        default = self.cache_size()
+        apply_sqlite_pragmas(sender=None, connection=connection)
+        self.assertEqual(default, self.cache_size())
+        try:
+            with override_settings(CHARTS_SQLITE_PRAGMAS={'cache_size': -1234}):
+                apply_sqlite_pragmas(sender=None, connection=connection)
+            self.assertEqual(-1234, self.cache_size())
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA cache_size = {default}')
+
+
+class SerializerTest(TestCase):
+    """时间轴各帧相同的部分提到 baseOption 中，合并后的每一帧与原来相同。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        import_sample_data()
+
+    def test_hoisted_frames_unchanged(self):
+        options = plain(site_views.generate_province_bar().get_options())
+        compact = compact_chart_options(options)
+        self.assertEqual(['series', 'title', 'xAxis'], sorted(compact['options'][0]))
+        self.assertNotIn('animation', compact['baseOption'])
+        for frame, compact_frame in zip(options['options'], compact['options']):
+            expected = {key: value for key, value in merge_option(options['baseOption'], frame).items()
+                        if not key.startswith('animation') and key != 'aria'}
+            self.assertEqual(expected, merge_option(compact['baseOption'], compact_frame))
+        self.assertLess(len(dumps(compact)), len(dumps(options)) / 3)
+
+    def test_fallback_encoder(self):
+        options = {'title': '全国', 'data': [1, float('nan'), 2.5], 'series': [{'data': [float('inf')]}]}
+        expected = '{"title":"全国","data":[1,null,2.5],"series":[{"data":[null]}]}'
+        with mock.patch('charts.serializer.orjson', None):
+            self.assertEqual(expected, dumps(options))
+        self.assertEqual(expected, dumps(options))
+
+
+class StaleWhileRevalidateTest(TransactionTestCase):
+    """数据版本变化后先返回旧版本的图表，所有图表在后台重建完成后换成新版本。"""
+
+    def setUp(self):
+        import_sample_data()
+        get_render_cache().clear()
+
+    def test_stale_chart_served_while_rebuilding(self):
+        names = site_views.site_obj.chart_names
+        stale = factory.get_chart_widget('gini')
+        old_version = get_data_version()
+        bump_data_version(Gini)
+        version = get_data_version()
+
+        with self.assertNumQueries(1):  # 只查询数据版本，请求不等待重建
+            chart = factory.get_chart_widget('gini')
+        self.assertEqual(stale.dump_options(), chart.dump_options())
+        warmer.wait()
+
+        cache = get_render_cache()
+        self.assertTrue(all(cache.has_key(render_cache_key(name, version)) for name in names))
+        self.assertEqual(version, cache.get(latest_version_key('gini')))
+        self.assertNotEqual(old_version, version)
+        with self.assertNumQueries(1):
+            factory.get_chart_widget('gini')
+
+    @override_settings(CHARTS_BACKGROUND_WARMUP=False)
+    def test_disabled(self):
+        factory.get_chart_widget('gini')
+        bump_data_version(Gini)
+        with CaptureQueriesContext(connection) as queries:
+            factory.get_chart_widget('gini')
+        self.assertTrue(any('charts_gini' in query['sql'] for query in queries.captured_queries))
+
+
+class WarmChartsCommandTest(TransactionTestCase):
+    """warm_charts 为当前数据版本构建所有图表，已经缓存的图表跳过。"""
+
+    def setUp(self):
+        import_sample_data()
+        get_render_cache().clear()
+
+    def test_warm_all_charts(self):
+        out = StringIO()
+        call_command('warm_charts', stdout=out)
+        self.assertIn(f'Warmed {len(site_views.site_obj.chart_names)} of', out.getvalue())
+        with self.assertNumQueries(1):
+            factory.get_chart_widget('Income_province')
+        out = StringIO()
+        call_command('warm_charts', charts=['gini'], stdout=out)
+        self.assertIn('already cached', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('warm_charts', charts=['missing'], stdout=StringIO())
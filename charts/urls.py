@@ -0,0 +1,13 @@
+from django.urls import path
+
+from charts import views
+
+urlpatterns = [
+    path('api/charts/<str:name>/data', views.chart_data, name='chart_data'),
+    path('api/charts/<str:name>/<str:version>/frames/<int:index>', views.chart_frame, name='chart_frame'),
+    path('metrics', views.metrics, name='metrics'),
+    # 覆盖 site_obj.urls 中的同名页面
+    path('', views.home, name='dje_home'),
+    path('collection/', views.collection, name='dje_chart_collection_all'),
+    path('collection/<slug:name>/', views.collection, name='dje_chart_collection'),
+]
@@ -0,0 +1,40 @@
+from django.db.models import F
+from django.dispatch import Signal
+
+from charts.models import DataVersion
+
+# 数据版本号：以模型名称为键，存放在数据库中，
+# 这样导入命令（独立进程）与网站进程看到的是同一个版本号。
+
+# 导入命令批量写入一张表之后发送（sender 为模型类）：bulk_create、bulk_update 不会发送 post_save
+data_imported = Signal()
+
+
+def bump_data_version(model):
+    name = model.__name__
+    updated = DataVersion.objects.filter(name=name).update(version=F('version') + 1)
+    if not updated:
+        DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+    # 本进程中该表旧版本的查询结果不会再被用到，立即释放
+    from charts.query_cache import query_cache
+    query_cache.discard_model(model._meta.label)
+
+
+def data_changed(sender, **kwargs):
+    """post_save、post_delete 与 data_imported 的接收函数：sender 表的数据发生变化，递增其版本号。"""
+    bump_data_version(sender)
+
+
+def get_data_versions():
+    """返回 {模型名称: 版本号}，只需一次查询。"""
+    return dict(DataVersion.objects.values_list('name', 'version'))
+
+
+def get_model_version(model):
+    return get_data_versions().get(model.__name__, 0)
+
+
+def get_data_version():
+    # 将所有表的版本号拼接为一个版本戳，任意一张表变化都会产生新的版本戳
+    versions = get_data_versions()
+    return '-'.join(f'{name}{versions[name]}' for name in sorted(versions)) or '0'
@@ -0,0 +1,228 @@
+import asyncio
+import gzip
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, HttpResponseGone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.http import require_safe
+from django_echarts.starter.sites import WidgetRefs
+from django_echarts.stores.entity_factory import factory
+
+from charts.instrumentation import render_metrics, timed
+from charts.render_cache import (RENDER_FORMAT, fresh_charts, get_render_cache, get_timeline_frame,
+                                  prefetched_widgets)
+from charts.serializer import dumps, merge_option
+from charts.site_views import site_obj
+from charts.versions import get_data_version
+
+# 数据接口的格式版本：接口输出格式变化时递增，使客户端缓存的 ETag 失效
+API_FORMAT_VERSION = 1
+
+_GZIP_RE = re.compile(r'\bgzip\b')
+
+# 并发预取部件的线程池：线程及其数据库连接在请求之间复用（CONN_MAX_AGE 生效），
+# 不会随 WSGI 下每个请求临时创建的事件循环一起销毁
+PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=getattr(settings, 'CHARTS_PREFETCH_WORKERS', 8),
+                                       thread_name_prefix='charts-prefetch')
+
+
+def compact_options(options):
+    """从图表 option 中只取出数据：各系列的 name/type/data，以及类目轴的 data。
+
+    时间轴图表返回 {"timeline": [...], "frames": [...]}，每一帧的结构与普通图表相同。
+    """
+    if 'baseOption' in options:
+        # 各帧只保存与 baseOption 不同的部分，先合并出完整的一帧
+        base = {key: value for key, value in options['baseOption'].items() if key != 'timeline'}
+        return {
+            'timeline': options['baseOption'].get('timeline', {}).get('data', []),
+            'frames': [compact_options(merge_option(base, frame)) for frame in options.get('options', [])],
+        }
+    data = {
+        'series': [
+            {key: s[key] for key in ('name', 'type', 'data') if s.get(key) is not None}
+            for s in options.get('series', [])
+        ],
+    }
+    for axis in ('xAxis', 'yAxis'):
+        categories = [a.get('data') for a in options.get(axis, []) if a.get('data')]
+        if categories:
+            data[axis] = categories
+    return data
+
+
+def get_chart_data(name, version):
+    """返回 (json, gzip 压缩后的 json)，按图表名称和数据版本缓存，同一版本只序列化、压缩一次。"""
+    cache = get_render_cache()
+    key = f'charts:api:{API_FORMAT_VERSION}:{RENDER_FORMAT}:{name}:{version}'
+    payload = cache.get(key)
+    if payload is None:
+        with fresh_charts():  # 按版本缓存的数据不能来自旧版本的图表
+            chart = factory.get_chart_widget(name)
+        body = dumps({'name': name, 'version': version, **compact_options(chart.get_options())}).encode('utf-8')
+        payload = (body, gzip.compress(body, mtime=0))
+        cache.set(key, payload, timeout=None)
+    return payload
+
+
+def versioned_response(request, etag_source, content_type, get_payload):
+    """带强 ETag 的响应：If-None-Match 命中时返回 304，不调用 get_payload；客户端支持时返回 gzip 压缩的内容。
+
+    etag_source 只由名称与数据版本组成，get_payload() 返回 (内容, gzip 压缩后的内容)。
+    """
+    use_gzip = bool(_GZIP_RE.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+    # 不同的内容编码使用不同的 ETag
+    digest = hashlib.sha1(f'{API_FORMAT_VERSION}:{RENDER_FORMAT}:{etag_source}'.encode('utf-8')).hexdigest()[:20]
+    etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        body, gzipped = get_payload()
+        response = HttpResponse(gzipped if use_gzip else body, content_type=content_type)
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'CHARTS_API_MAX_AGE', 0),
+                        must_revalidate=True)
+    return response
+
+
+@require_safe
+def chart_data(request, name):
+    """/api/charts/<name>/data：图表的系列数据，带强 ETag，支持 304 与 gzip。"""
+    if name not in site_obj.chart_names:
+        raise Http404(f'Chart "{name}" does not exist')
+    version = get_data_version()
+    return versioned_response(request, f'{name}:{version}', 'application/json',
+                              lambda: get_chart_data(name, version))
+
+
+class FrameVersionGone(Exception):
+    """请求的帧属于已被替换的数据版本，且已不在缓存中。"""
+
+
+def get_frame_payload(name, version, index):
+    cache = get_render_cache()
+    key = f'charts:api-frame:{API_FORMAT_VERSION}:{RENDER_FORMAT}:{name}:{version}:{index}'
+    payload = cache.get(key)
+    if payload is None:
+        current = version == get_data_version()
+        # 旧版本的帧只能从缓存中取出，重新构建得到的是当前版本的数据
+        frame = get_timeline_frame(name, version, index, rebuild=current)
+        if frame is None:
+            if not current:
+                raise FrameVersionGone(version)
+            raise Http404(f'Chart "{name}" has no frame {index}')
+        body = frame.encode('utf-8')
+        payload = (body, gzip.compress(body, mtime=0))
+        cache.set(key, payload, timeout=None)
+    return payload
+
+
+@require_safe
+def chart_frame(request, name, version, index):
+    """/api/charts/<name>/<version>/frames/<index>：按需加载的时间轴在该数据版本的一帧（JS 对象字面量，可能包含 JS 函数）。
+
+    该版本的帧已不可用时返回 410，页面重新加载后取得当前版本；不会把其他版本的帧交给旧页面。
+    """
+    if name not in site_obj.chart_names:
+        raise Http404(f'Chart "{name}" does not exist')
+    try:
+        return versioned_response(request, f'{name}:{version}:{index}', 'text/javascript; charset=utf-8',
+                                  lambda: get_frame_payload(name, version, index))
+    except FrameVersionGone:
+        return HttpResponseGone()
+
+
+@require_safe
+def metrics(request):
+    """/metrics：本进程的请求、模板与各图表耗时直方图（Prometheus 文本格式）。
+
+    CHARTS_METRICS_ENABLED 关闭时返回 404；只允许 CHARTS_METRICS_ALLOWED_IPS 中的地址或已登录的管理员访问。
+    """
+    if not getattr(settings, 'CHARTS_METRICS_ENABLED', False):
+        raise Http404('Metrics are disabled')
+    user = getattr(request, 'user', None)
+    if (request.META.get('REMOTE_ADDR') not in getattr(settings, 'CHARTS_METRICS_ALLOWED_IPS', ())
+            and not (user is not None and user.is_staff)):
+        raise PermissionDenied
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def load_widget(kind, name):
+    # 取得一个部件，图表经过渲染缓存
+    return factory.get_chart_widget(name) if kind == 'chart' else factory.get_html_widget(name)
+
+
+def load_widget_in_thread(kind, name):
+    # 在线程池的线程中取得部件，结束后按 CONN_MAX_AGE 释放该线程的数据库连接
+    try:
+        return load_widget(kind, name)
+    finally:
+        close_old_connections()
+
+
+async def prefetch_widgets(refs):
+    """并发取得页面需要的各个部件，返回 {(类型, 名称): 部件}；页面的耗时取决于最慢的部件，而不是所有部件之和。"""
+    refs = list(dict.fromkeys(refs))
+    load = sync_to_async(load_widget_in_thread, thread_sensitive=False, executor=PREFETCH_EXECUTOR)
+    widgets = await asyncio.gather(*(load(kind, name) for kind, name in refs))
+    return dict(zip(refs, widgets))
+
+
+def home_widget_refs():
+    # 首页：大背景图表与数值面板
+    refs = []
+    for ref_name, kind in ((WidgetRefs.home_jumbotron_chart, 'chart'), (WidgetRefs.home_values_panel, 'html')):
+        uri = site_obj.ref2uri[ref_name]
+        if not uri.is_empty():
+            refs.append((kind, uri.name))
+    return refs
+
+
+def collection_widget_refs(name='all'):
+    # 合辑页：全部图表，或该合辑中引用的图表与 HTML 部件
+    if name == 'all':
+        return [('chart', info.name) for info in factory.chart_info_manager.query_chart_info_list()]
+    collection = site_obj._collection_dic.get(name)
+    if collection is None:
+        return []
+    refs = []
+    for is_chart, _, *uri_list in collection._ref_config_list:
+        refs += [('chart' if is_chart else 'html', uri.name) for uri in uri_list]
+    return refs
+
+
+def render_with_widgets(view, request, widgets, args, kwargs):
+    # 在预取结果可见的上下文中调用同步视图，并在同一上下文中完成模板渲染
+    token = prefetched_widgets.set(widgets)
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            with timed('template'):
+                response.render()
+        return response
+    finally:
+        prefetched_widgets.reset(token)
+
+
+def async_page_view(view, widget_refs):
+    """把站点的同步页面视图包装为异步视图：先并发取得 widget_refs(**kwargs) 列出的部件，再渲染页面。"""
+
+    async def page_view(request, *args, **kwargs):
+        widgets = await prefetch_widgets(widget_refs(**kwargs))
+        return await sync_to_async(render_with_widgets)(view, request, widgets, args, kwargs)
+
+    return page_view
+
+
+# 首页与合辑页一次需要多个图表，改用并发取得部件的异步视图（在 ASGI 下运行，WSGI 下同样可用）
+home = async_page_view(site_obj._view_dict['dje_home'].as_view(), home_widget_refs)
+collection = async_page_view(site_obj._view_dict['dje_chart_collection'].as_view(), collection_widget_refs)
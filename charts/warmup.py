@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from charts.render_cache import build_chart, chart_functions, fresh_charts, get_render_cache, render_cache_key
+from charts.versions import get_data_version
+
+# 后台预热：数据版本变化后在线程池中重建所有图表并写入渲染缓存，请求期间先返回旧版本（stale-while-revalidate），
+# 不必等待重建；也可以由轮询线程发现版本变化后主动重建，或在导入后运行 warm_charts 命令。
+
+logger = logging.getLogger(__name__)
+
+
+def warm_chart(name, version=None, force=False):
+    """构建一个图表并写入渲染缓存，返回耗时（秒）；该版本已经缓存且不强制重建时跳过，返回 None。"""
+    if version is None:
+        version = get_data_version()
+    if not force and get_render_cache().has_key(render_cache_key(name, version)):
+        return None
+    start = time.perf_counter()
+    with fresh_charts():
+        build_chart(name, version)
+    return time.perf_counter() - start
+
+
+class ChartWarmer:
+    """在后台线程池中重建图表；同一图表、同一版本正在重建时不会重复安排。"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = {}  # (图表名称, 版本) -> Future
+        self.poller = None
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers or getattr(settings, 'CHARTS_WARM_WORKERS', 4),
+                    thread_name_prefix='charts-warm')
+            return self.executor
+
+    def submit(self, name, version, force=False):
+        executor = self.get_executor()
+        with self.lock:
+            future = self.pending.get((name, version))
+            if future is None:
+                future = self.pending[(name, version)] = executor.submit(self.run, name, version, force)
+        return future
+
+    def run(self, name, version, force):
+        try:
+            return warm_chart(name, version, force)
+        except Exception:
+            logger.exception('Warming chart "%s" for data version %s failed', name, version)
+            raise
+        finally:
+            with self.lock:
+                self.pending.pop((name, version), None)
+            close_old_connections()  # 线程池中的线程按 CONN_MAX_AGE 释放数据库连接
+
+    def warm_all(self, version, names=None, force=False):
+        """安排重建全部（或 names 中的）图表，返回各图表的 Future。"""
+        return [self.submit(name, version, force) for name in (names or list(chart_functions))]
+
+    def wait(self, timeout=None):
+        # 等待所有已安排的重建完成
+        with self.lock:
+            futures = list(self.pending.values())
+        return wait(futures, timeout=timeout)
+
+    def start_polling(self, interval):
+        """启动轮询线程：每 interval 秒查询一次数据版本，变化时（包括启动后第一次）重建所有图表。"""
+        with self.lock:
+            if self.poller is not None:
+                return
+            self.poller = threading.Thread(target=self.poll, args=(interval,), name='charts-warm-poll', daemon=True)
+        self.poller.start()
+
+    def poll(self, interval):
+        version = None
+        while True:
+            try:
+                latest = get_data_version()
+                if latest != version:
+                    wait(self.warm_all(latest))
+                    version = latest
+            except Exception:
+                logger.exception('Polling the data version failed')
+            finally:
+                close_old_connections()
+            time.sleep(interval)
+
+
+warmer = ChartWarmer()
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'charts.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'charts.middleware.PageViewMiddleware',
+    'charts.middleware.ChartWarmupMiddleware',
 ]
 
 ROOT_URLCONF = 'echarts_DV.urls'
@@ -124,6 +127,73 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static').replace('\\', '/'),)
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # 图表渲染缓存，本地内存后端按 LRU 淘汰；多进程部署时可换成 Redis/Memcached 等共享后端
+    'charts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'charts-render',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1024,
+        },
+    },
+}
+
+CHARTS_RENDER_CACHE = 'charts'
+
+# 进程内 ORM 查询结果缓存（列式数据存储、大区汇总等）的总大小上限（字节），按估算大小 LRU 淘汰；0 表示不缓存
+CHARTS_QUERY_CACHE_BYTES = 64 * 1024 * 1024
+
+# 图表数据接口 /api/charts/<name>/data 的 Cache-Control max-age（秒），0 表示每次都用 ETag 重新验证
+CHARTS_API_MAX_AGE = 0
+
+# 帧数不少于该值的时间轴按需加载：页面只包含第一帧，其余帧从 /api/charts/<name>/<version>/frames/<index> 获取；None 表示关闭
+CHARTS_LAZY_TIMELINE_MIN_FRAMES = 8
+
+# 3D 柱状图的数据点上限：超过时按年汇总季度数据（取每年最后一个季度的累计值），仍超过时等间隔抽取年份；None 表示不限制
+CHARTS_BAR3D_MAX_POINTS = 2000
+
+# 折线/柱状图每个系列的最多数据点数，超过时在服务端降采样（折线用 LTTB，柱状图按区间取平均）；None 表示不限制
+CHARTS_DEFAULT_MAX_POINTS = 1000
+# 按图表名称单独设置最多数据点数，如 {'Income_quarter': 200}
+CHARTS_MAX_POINTS = {}
+# 是否同时开启 ECharts 客户端的降采样（折线 sampling="lttb"）与柱状图的 large 模式
+CHARTS_CLIENT_SAMPLING = False
+
+# 页面访问次数在内存中累计，达到该次数或距上次写入超过该秒数时批量写入数据库
+CHARTS_PAGE_VIEW_FLUSH_SIZE = 100
+CHARTS_PAGE_VIEW_FLUSH_INTERVAL = 10
+
+# 在响应头 Server-Timing 中给出请求、查询、模板与各图表的耗时；/metrics 直方图的桶上界（秒）
+CHARTS_SERVER_TIMING = True
+CHARTS_METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# /metrics 是否开启；开启时只允许这些地址或已登录的管理员访问
+CHARTS_METRICS_ENABLED = True
+CHARTS_METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+# 首页与合辑页并发取得图表的线程数
+CHARTS_PREFETCH_WORKERS = 8
+
+# 数据版本变化后先返回旧版本的图表，同时在后台线程池（CHARTS_WARM_WORKERS 个线程）中重建所有图表；
+# CHARTS_WARM_POLL_INTERVAL 为后台轮询数据版本的间隔（秒），发现变化即重建，None 表示不轮询
+CHARTS_BACKGROUND_WARMUP = True
+CHARTS_WARM_WORKERS = 4
+CHARTS_WARM_POLL_INTERVAL = None
+
+# 列式数据快照文件（manage.py export_snapshot 生成，每次导入后自动重新导出）：各进程以只读方式内存映射，
+# 版本号与数据库一致的表不再查询 SQLite；None 表示不使用快照
+CHARTS_SNAPSHOT_PATH = None
+
+# 静态站点输出目录：设置后每次导入数据都会运行 prerender_site 重新生成，None 表示不自动生成
+CHARTS_PRERENDER_DIR = None
+
 DJANGO_ECHARTS = {
     # ...
     'theme_name': 'bootstrap5.yeti'
@@ -0,0 +1,116 @@
+"""
+Production settings for echarts_DV.
+
+Select with DJANGO_SETTINGS_MODULE=echarts_DV.settings_production. Everything not set here
+comes from echarts_DV.settings; deployment specific values are read from the environment:
+
+    DJANGO_SECRET_KEY        required
+    DJANGO_ALLOWED_HOSTS     comma separated, default "localhost,127.0.0.1"
+    DJANGO_DEBUG             "1" to turn DEBUG back on (default off)
+    DJANGO_SQLITE_PATH       database file, default BASE_DIR / "db.sqlite3"
+    DJANGO_CONN_MAX_AGE      seconds a database connection is reused, default 600
+    DJANGO_STATIC_ROOT       collectstatic target, default BASE_DIR / "staticfiles"
+    CHARTS_CACHE_DIR         use a file based render cache shared by all worker processes
+    CHARTS_SNAPSHOT_PATH     memory-mapped chart data snapshot, re-exported after every import
+    CHARTS_SERVER_TIMING     "1" to send the Server-Timing header (default off)
+    CHARTS_METRICS           "1" to serve /metrics (default off)
+    CHARTS_METRICS_ALLOWED_IPS  comma separated addresses allowed to read /metrics without a staff login
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, DATABASES, STATICFILES_DIRS, TEMPLATES
+
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes', 'on')
+
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Set the DJANGO_SECRET_KEY environment variable to use the production settings')
+
+# 关闭 DEBUG：不再在内存中记录每一条 SQL，异常页面也不会泄露配置
+DEBUG = env_flag('DJANGO_DEBUG')
+
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+                 if host.strip()]
+
+# 数据库连接在请求之间复用，不必每个请求重新打开；timeout 为 SQLite 等待写锁的秒数
+DATABASES = {
+    **DATABASES,
+    'default': {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DJANGO_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+        'OPTIONS': {'timeout': 20},
+    },
+}
+
+# 每个新连接执行的 SQLite PRAGMA：WAL 模式下读写互不阻塞，synchronous=NORMAL 在 WAL 下仍然不会损坏数据库
+CHARTS_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,  # 页缓存约 20MB
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,  # 256MB
+}
+
+# 模板只解析一次，编译结果缓存在进程内
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'APP_DIRS': False,
+        'OPTIONS': {
+            **TEMPLATES[0]['OPTIONS'],
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
+        },
+    },
+]
+
+# 渲染缓存：默认每个进程各自一份本地内存缓存；设置 CHARTS_CACHE_DIR 后改为所有进程共用的文件缓存，
+# 一个进程构建的图表其他进程可以直接使用
+CACHES = {
+    **CACHES,
+    'charts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'charts-render',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 4096,
+        },
+    },
+}
+if os.environ.get('CHARTS_CACHE_DIR'):
+    CACHES['charts'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['CHARTS_CACHE_DIR'],
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 4096,
+        },
+    }
+
+# 数据快照：worker 启动后内存映射快照，不必各自查询并重建列式数据
+CHARTS_SNAPSHOT_PATH = os.environ.get('CHARTS_SNAPSHOT_PATH') or None
+
+# 静态文件名带内容哈希，可以设置很长的缓存时间；部署前需要运行 collectstatic
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+# 仓库中没有 static 目录时 collectstatic 会报错，只保留实际存在的目录
+STATICFILES_DIRS = [path for path in STATICFILES_DIRS if os.path.isdir(path)]
+
+# Server-Timing 与 /metrics 会暴露内部耗时，生产环境默认关闭；/metrics 开启后只允许指定地址或管理员访问
+CHARTS_SERVER_TIMING = env_flag('CHARTS_SERVER_TIMING')
+CHARTS_METRICS_ENABLED = env_flag('CHARTS_METRICS')
+CHARTS_METRICS_ALLOWED_IPS = tuple(address.strip() for address in
+                                   os.environ.get('CHARTS_METRICS_ALLOWED_IPS', '').split(',') if address.strip())
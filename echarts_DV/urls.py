@@ -20,5 +20,6 @@ from charts.site_views import site_obj
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('', include('charts.urls')),
     path('', include(site_obj.urls)),
 ]